@@ -0,0 +1,166 @@
+import numpy as np
+
+from agent.state_action_value_table import greedy_mask, epsilon_greedy_expectation
+from gridworld import GridWorld
+from gridworld.vector_gridworld import VectorGridWorld
+from rl.random_streams import spawn_generator
+
+methods = ("sarsa", "q_learning", "expected_sarsa", "true_online_sarsa_lambda")
+
+
+class BatchedTabularLearner:
+    """
+    Independent tabular learners, one per trial, trained in lockstep. The
+    trials' tables are slices of one (num_trials, num_states, num_actions) array
+    and each trial acts in its own copy of the domain, so one step of every
+    trial is a handful of array operations.
+
+    Each trial follows the same algorithm as SarsaAgent (plain or expected),
+    QLearning with a dense table, or TrueOnlineSarsaLambda with its default
+    one-hot state features. Hyperparameters may be given per trial, so a sweep
+    over them trains as one batch.
+    """
+
+    def __init__(self, domain: GridWorld, num_trials: int, method="sarsa", epsilon=0.1, alpha=0.2, gamma=0.95,
+                 lamb=0.95, initial_value=0.0, tolerance=0.000001, rng: np.random.Generator = None):
+        """
+        :param method: One of "sarsa", "q_learning", "expected_sarsa" or "true_online_sarsa_lambda"
+        :param epsilon: A scalar, or one value per trial
+        :param alpha: A scalar, or one value per trial
+        :param lamb: A scalar, or one value per trial. Only used by "true_online_sarsa_lambda"
+        :param tolerance: Values this close to the best are treated as ties, as in DenseStateActionValueTable
+        """
+        assert method in methods
+        self.method = method
+        self.num_trials = num_trials
+        self.gamma = gamma
+        self.tolerance = tolerance
+        self.epsilon = np.broadcast_to(np.asarray(epsilon, dtype=float), (num_trials,)).copy()
+        self.alpha = np.broadcast_to(np.asarray(alpha, dtype=float), (num_trials,)).copy()
+        self.lamb = np.broadcast_to(np.asarray(lamb, dtype=float), (num_trials,)).copy()
+        self.rng = rng if rng is not None else spawn_generator()
+
+        self.env = VectorGridWorld(domain, num_trials, self.rng)
+        self.width = domain.width
+        self.num_states = domain.state_indexer().number_of_states
+        self.num_actions = len(domain.actions)
+        # Direction value of each action column
+        self.directions = np.array([action.direction.value for action in domain.actions])
+
+        self.values = np.full((num_trials, self.num_states, self.num_actions), initial_value)
+        self.episodes = np.zeros(num_trials, dtype=int)
+        # State eligibility traces, as TrueOnlineSarsaLambda keeps over its state features
+        self.eligibility = None
+        if method == "true_online_sarsa_lambda":
+            self.eligibility = np.zeros((num_trials, self.num_states))
+        trials = np.arange(num_trials)
+        self.actions = self.choose_actions(trials, self.env.state_indices())
+
+    def choose_actions(self, trials: np.ndarray, states: np.ndarray) -> np.ndarray:
+        """
+        Epsilon-greedy action columns for each trial in `trials` at the matching
+        entry of `states`, with ties broken uniformly at random.
+        """
+        greedy = greedy_mask(self.values[trials, states], self.tolerance)
+        # The largest random score among the tied actions picks one uniformly
+        choices = np.argmax(self.rng.random(greedy.shape) * greedy, axis=1)
+        explore = self.rng.random(len(trials)) < self.epsilon[trials]
+        random_actions = self.rng.integers(0, self.num_actions, len(trials))
+        return np.where(explore, random_actions, choices)
+
+    def train(self, num_episodes: int):
+        """
+        Trains every trial until it has completed `num_episodes` episodes in
+        total. Trials that get there first wait for the others.
+        """
+        active = self.episodes < num_episodes
+        while active.any():
+            self.step(active)
+            active = self.episodes < num_episodes
+
+    def step(self, active: np.ndarray):
+        """
+        Takes one step and one update in each active trial.
+
+        :param active: Boolean array selecting the trials to advance
+        """
+        trials = np.flatnonzero(active)
+        states = self.env.state_indices()[trials]
+        actions = self.actions[trials]
+
+        x, y, rewards, dones = self.env.step(self.directions[self.actions], mask=active)
+        states_prime = (y * self.width + x)[trials]
+        rewards = rewards[trials]
+        dones = dones[trials]
+
+        # Sarsa picks its next action before updating, Q-learning after
+        actions_prime = None
+        if self.method != "q_learning":
+            actions_prime = self.choose_actions(trials, states_prime)
+
+        if self.method == "true_online_sarsa_lambda":
+            self._update_true_online(trials, states, actions, rewards, states_prime, dones)
+        else:
+            self._update(trials, states, actions, rewards, states_prime, actions_prime, dones)
+
+        if self.method == "q_learning":
+            actions_prime = self.choose_actions(trials, states_prime)
+
+        if dones.any():
+            finished = trials[dones]
+            self.episodes[finished] += 1
+            reset = np.zeros(self.num_trials, dtype=bool)
+            reset[finished] = True
+            self.env.reset(reset)
+            actions_prime[dones] = self.choose_actions(finished, self.env.state_indices()[finished])
+
+        self.actions[trials] = actions_prime
+
+    def _update(self, trials, states, actions, rewards, states_prime, actions_prime, dones):
+        values = self.values
+        if self.method == "q_learning":
+            targets = values[trials, states_prime].max(axis=1)
+        elif self.method == "expected_sarsa":
+            targets = epsilon_greedy_expectation(values[trials, states_prime], self.epsilon[trials, np.newaxis],
+                                                 self.tolerance)
+        else:
+            targets = values[trials, states_prime, actions_prime]
+        # Terminal states are defined to have value 0
+        targets = np.where(dones, 0.0, targets)
+
+        # Each trial appears once, so the fancy-indexed update can't collide
+        old_values = values[trials, states, actions]
+        values[trials, states, actions] = old_values + self.alpha[trials] * (
+            rewards + self.gamma * targets - old_values)
+
+    def _update_true_online(self, trials, states, actions, rewards, states_prime, dones):
+        """
+        TrueOnlineSarsaLambda's update with one-hot state features, where each
+        weight is one table entry. Like that agent, it values the next state
+        with the weights of the action just taken, and keeps traces across
+        episodes.
+        """
+        values = self.values
+        eligibility = self.eligibility
+        alpha = self.alpha[trials]
+        gamma_lambda = self.gamma * self.lamb[trials]
+
+        old_values = values[trials, states, actions]
+        traces = eligibility[trials]
+        increments = alpha * (1.0 - gamma_lambda * traces[np.arange(len(trials)), states])
+        traces *= gamma_lambda[:, np.newaxis]
+        traces[np.arange(len(trials)), states] += increments
+
+        # Terminal states are defined to have value 0
+        values_prime = np.where(dones, 0.0, values[trials, states_prime, actions])
+        deltas = rewards + self.gamma * values_prime - old_values
+        values[trials, :, actions] += deltas[:, np.newaxis] * traces
+
+        traces[traces < 0.00001] = 0.0
+        eligibility[trials] = traces
+
+    def snapshot(self) -> np.ndarray:
+        """
+        :return: A copy of every trial's table
+        """
+        return self.values.copy()
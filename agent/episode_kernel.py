@@ -0,0 +1,269 @@
+import numpy as np
+
+from agent.q_learning import QLearning
+from agent.sarsa_agent import SarsaAgent
+from agent.state_action_value_table import DenseStateActionValueTable
+from gridworld import GridWorld, ReachExit
+
+# Wind outcomes, in the order GridWorld.apply_action tests the die roll
+_weaker = 0
+_stronger = 1
+_calm = 2
+
+
+class EpisodeKernel:
+    """
+    Runs whole training episodes of a tabular agent over integer state codes.
+    The domain and task (a ReachExit) are compiled once into flat next-state,
+    reward and terminal tables, and values are read from a flat list for the duration of
+    an episode, so a step allocates nothing.
+
+    Episodes draw from the agent's and domain's random streams in the same
+    order as the agent's act(), so a seeded run learns exactly the same table
+    as the object API.
+    """
+
+    def __init__(self, agent):
+        assert EpisodeKernel.supports(agent)
+        self.agent = agent
+        domain = agent.world
+        task = agent.task
+        table = agent.value_function
+        self.domain = domain
+        self.num_actions = len(table.actions)
+        self.indexer = table.state_index
+
+        # Sets iterate in hash order, so this is the order act() samples actions in
+        example_state = domain.get_current_state()
+        self.action_order = [table.action_index[action] for action in domain.get_actions(example_state)]
+
+        num_states = self.indexer.number_of_states
+        cells = np.arange(0, num_states)
+        x = cells % domain.width
+        y = cells // domain.width
+        strength = domain.wind_field[y, x]
+        self.windy = (strength > 0).tolist()
+        self.terminal = task.terminal_mask().ravel().tolist()
+
+        # Indexed by (s * num_actions + a) * 3 + wind outcome
+        next_states = np.zeros((num_states, self.num_actions, 3), dtype=int)
+        rewards = np.zeros((num_states, self.num_actions, 3))
+        outcome_strengths = [np.where(strength > 0, strength - 1, 0), np.where(strength > 0, strength + 1, 0),
+                             np.zeros_like(strength)]
+        for action in table.actions:
+            a = table.action_index[action]
+            directions = np.full(num_states, action.direction.value)
+            for (outcome, wind_strengths) in enumerate(outcome_strengths):
+                x_prime, y_prime = domain.next_positions(x, y, directions, wind_strengths)
+                next_states[:, a, outcome] = y_prime * domain.width + x_prime
+                rewards[:, a, outcome] = task.rewards(x, y, x_prime, y_prime)
+        self.next_states = next_states.ravel().tolist()
+        self.rewards = rewards.ravel().tolist()
+
+    @staticmethod
+    def supports(agent) -> bool:
+        """
+        Whether `agent` is a plain tabular agent the kernel reproduces: SarsaAgent
+        or QLearning with a dense table on a GridWorld with ReachExit, without
+        replay or planning, drawing from the same stream as its domain.
+        """
+        if not isinstance(agent, (SarsaAgent, QLearning)):
+            return False
+        if not isinstance(agent.value_function, DenseStateActionValueTable) or not isinstance(agent.world, GridWorld):
+            return False
+        if not isinstance(agent.task, ReachExit):
+            return False
+        if getattr(agent, "replay", None) is not None or agent.planner is not None:
+            return False
+        if agent.rng is not agent.world.rng:
+            return False
+        return True
+
+    def run_episode(self, max_steps: int = None) -> float:
+        """
+        Trains the agent for one episode from the domain's current state.
+
+        :param max_steps: End the episode after this many steps even if it hasn't terminated
+        :return: The episode's return
+        """
+        agent = self.agent
+        table = agent.value_function
+        values = table.values.ravel().tolist()
+        if isinstance(agent, QLearning):
+            episode_return = self._q_learning_episode(values, max_steps)
+        else:
+            episode_return = self._sarsa_episode(values, max_steps)
+        table.writablevalues()[:] = np.reshape(values, table.values.shape)
+        return episode_return
+
+    def _sarsa_episode(self, values, max_steps):
+        agent = self.agent
+        epsilon = agent.epsilon
+        alpha = agent.alpha
+        gamma = agent.gamma
+        expected = agent.expected
+        tolerance = agent.value_function.tolerance
+        num_actions = self.num_actions
+        action_order = self.action_order
+        next_states = self.next_states
+        rewards = self.rewards
+        terminal = self.terminal
+        windy = self.windy
+        stochasticity = self.domain.stochasticity
+        num_choices = len(action_order)
+        # The agent and domain share this stream; read its block directly
+        stream = agent.rng
+        block = stream.reserve(3)
+        size = len(block)
+        position = 0
+
+        state = self.indexer(self.domain.get_current_state())
+        previous = -1
+        previous_reward = 0.0
+        episode_return = 0.0
+        steps = 0
+        while True:
+            steps += 1
+            base = state * num_actions
+
+            # Epsilon-greedy, sampling from the same orderings as choose_action.
+            # A step draws at most three numbers
+            if position + 3 > size:
+                stream.position = position
+                block = stream.reserve(3)
+                size = len(block)
+                position = 0
+
+            if block[position] < epsilon:
+                action = action_order[int(block[position + 1] * num_choices)]
+            else:
+                threshold = max(values[base:base + num_actions]) - tolerance
+                best = [a for a in action_order if values[base + a] >= threshold]
+                action = best[int(block[position + 1] * len(best))]
+            position += 2
+
+            outcome = _calm
+            if windy[state]:
+                die_roll = block[position] * 3.0
+                position += 1
+                if die_roll < 0 + stochasticity:
+                    outcome = _weaker
+                elif die_roll > 3 - stochasticity:
+                    outcome = _stronger
+            i = (base + action) * 3 + outcome
+            state_prime = next_states[i]
+            reward = rewards[i]
+
+            # The previous transition is updated once this state's action is known
+            if previous >= 0:
+                if expected:
+                    target = self._expectation(values[base:base + num_actions], epsilon, tolerance)
+                else:
+                    target = values[base + action]
+                old_value = values[previous]
+                values[previous] = old_value + alpha * (previous_reward + gamma * target - old_value)
+                episode_return += previous_reward
+
+            previous = base + action
+            previous_reward = reward
+
+            if terminal[state_prime]:
+                # Terminal states are defined to have value 0
+                old_value = values[previous]
+                values[previous] = old_value + alpha * (reward + gamma * 0 - old_value)
+                episode_return += reward
+                break
+            if max_steps is not None and steps >= max_steps:
+                break
+            state = state_prime
+
+        stream.position = position
+        self._finish(state_prime)
+        return episode_return
+
+    def _q_learning_episode(self, values, max_steps):
+        agent = self.agent
+        epsilon = agent.epsilon
+        alpha = agent.alpha
+        gamma = agent.gamma
+        tolerance = agent.value_function.tolerance
+        num_actions = self.num_actions
+        action_order = self.action_order
+        next_states = self.next_states
+        rewards = self.rewards
+        terminal = self.terminal
+        windy = self.windy
+        stochasticity = self.domain.stochasticity
+        num_choices = len(action_order)
+        # The agent and domain share this stream; read its block directly
+        stream = agent.rng
+        block = stream.reserve(3)
+        size = len(block)
+        position = 0
+
+        state = self.indexer(self.domain.get_current_state())
+        episode_return = 0.0
+        steps = 0
+        while True:
+            steps += 1
+            base = state * num_actions
+
+            # A step draws at most three numbers
+            if position + 3 > size:
+                stream.position = position
+                block = stream.reserve(3)
+                size = len(block)
+                position = 0
+
+            if block[position] < epsilon:
+                action = action_order[int(block[position + 1] * num_choices)]
+            else:
+                threshold = max(values[base:base + num_actions]) - tolerance
+                best = [a for a in action_order if values[base + a] >= threshold]
+                action = best[int(block[position + 1] * len(best))]
+            position += 2
+
+            outcome = _calm
+            if windy[state]:
+                die_roll = block[position] * 3.0
+                position += 1
+                if die_roll < 0 + stochasticity:
+                    outcome = _weaker
+                elif die_roll > 3 - stochasticity:
+                    outcome = _stronger
+            i = (base + action) * 3 + outcome
+            state_prime = next_states[i]
+            reward = rewards[i]
+
+            # Terminal states are defined to have value 0
+            if terminal[state_prime]:
+                target = 0
+            else:
+                # QLearning takes the first of the tied best actions in set order
+                base_prime = state_prime * num_actions
+                threshold = max(values[base_prime:base_prime + num_actions]) - tolerance
+                target = next(values[base_prime + a] for a in action_order if values[base_prime + a] >= threshold)
+            old_value = values[base + action]
+            values[base + action] = old_value + alpha * (reward + gamma * target - old_value)
+            episode_return += reward
+
+            if terminal[state_prime]:
+                break
+            if max_steps is not None and steps >= max_steps:
+                break
+            state = state_prime
+
+        stream.position = position
+        self._finish(state_prime)
+        return episode_return
+
+    @staticmethod
+    def _expectation(row, epsilon, tolerance):
+        # epsilon_greedy_expectation of a single row, with the same arithmetic
+        threshold = max(row) - tolerance
+        best = [value for value in row if value >= threshold]
+        return epsilon * sum(row) / len(row) + (1.0 - epsilon) * sum(best) / len(best)
+
+    def _finish(self, state_prime: int):
+        # Leave the domain where the episode ended, as act() would
+        self.domain.agent_y, self.domain.agent_x = divmod(state_prime, self.domain.width)
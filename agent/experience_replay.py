@@ -0,0 +1,58 @@
+import numpy as np
+
+from rl.random_streams import spawn_generator
+
+
+class ReplayBuffer:
+    """
+    A fixed-capacity ring buffer of integer-encoded transitions. Once full, the
+    oldest transitions are overwritten.
+    """
+
+    def __init__(self, capacity: int, rng: np.random.Generator = None):
+        self.capacity = capacity
+        self.rng = rng if rng is not None else spawn_generator()
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.size = 0
+        self.position = 0
+
+    def add(self, state: int, action: int, reward: float, next_state: int, done: bool):
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size: int):
+        """
+        Draws transitions uniformly, with replacement.
+
+        :return: (states, actions, rewards, next_states, dones) arrays
+        """
+        indices = self.rng.integers(0, self.size, batch_size)
+        return (self.states[indices], self.actions[indices], self.rewards[indices], self.next_states[indices],
+                self.dones[indices])
+
+
+def q_learning_backup(values: np.ndarray, batch, alpha: float, gamma: float):
+    """
+    Applies Q-learning updates for a minibatch to a (num_states, num_actions)
+    array in place. Every target is computed from the values before the batch.
+    A pair sampled several times moves by alpha towards the mean of its
+    targets, so duplicates can't compound into a step larger than alpha.
+    """
+    states, actions, rewards, next_states, dones = batch
+    # Terminal states are defined to have value 0
+    targets = rewards + gamma * np.where(dones, 0.0, values[next_states].max(axis=1))
+    errors = targets - values[states, actions]
+    pairs = states * values.shape[1] + actions
+    _, inverse, counts = np.unique(pairs, return_inverse=True, return_counts=True)
+    counts = counts[inverse]
+    np.add.at(values, (states, actions), alpha * errors / counts)
@@ -0,0 +1,163 @@
+from typing import Tuple
+
+import numpy as np
+
+from agent.state_action_value_table import DenseStateActionValueTable
+
+
+class IndexedPriorityQueue:
+    """
+    A binary max-heap of integer keys that knows where each key sits, so the
+    priority of a queued key can be raised or lowered in O(log n).
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.priorities = dict()
+        self.positions = dict()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, key: int):
+        return key in self.positions
+
+    def update(self, key: int, priority: float):
+        """
+        Queues `key`, or changes its priority if it is already queued.
+        """
+        position = self.positions.get(key)
+        if position is None:
+            self.heap.append(key)
+            self.positions[key] = len(self.heap) - 1
+            self.priorities[key] = priority
+            self._sift_up(len(self.heap) - 1)
+            return
+
+        old_priority = self.priorities[key]
+        self.priorities[key] = priority
+        if priority > old_priority:
+            self._sift_up(position)
+        else:
+            self._sift_down(position)
+
+    def pop(self) -> Tuple[int, float]:
+        """
+        Removes the key with the highest priority.
+
+        :return: The key and its priority
+        """
+        top = self.heap[0]
+        last = self.heap.pop()
+        if self.heap:
+            self.heap[0] = last
+            self.positions[last] = 0
+            self._sift_down(0)
+        del self.positions[top]
+        return top, self.priorities.pop(top)
+
+    def _swap(self, i: int, j: int):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.positions[heap[i]] = i
+        self.positions[heap[j]] = j
+
+    def _sift_up(self, i: int):
+        priorities = self.priorities
+        while i > 0:
+            parent = (i - 1) // 2
+            if priorities[self.heap[i]] <= priorities[self.heap[parent]]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int):
+        priorities = self.priorities
+        size = len(self.heap)
+        while True:
+            largest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and priorities[self.heap[child]] > priorities[self.heap[largest]]:
+                    largest = child
+            if largest == i:
+                break
+            self._swap(i, largest)
+            i = largest
+
+
+class PrioritizedSweepingPlanner:
+    """
+    Model-based planning with prioritized sweeping (Moore & Atkeson, 1993).
+    Real transitions train a count-based model over integer states; planning
+    then backs up the state-action pairs whose values are most out of date and
+    pushes their predecessors onto the queue.
+
+    Backups are Q-learning style expected updates through the learned model.
+    """
+
+    def __init__(self, table: DenseStateActionValueTable, alpha: float, gamma: float, planning_steps: int,
+                 threshold=0.0001):
+        self.table = table
+        self.alpha = alpha
+        self.gamma = gamma
+        self.planning_steps = planning_steps
+        self.threshold = threshold
+        self.num_actions = len(table.actions)
+
+        # (s, a) key -> {s': [count, summed reward]}
+        self.outcomes = dict()
+        self.visits = dict()
+        # s' -> keys of the (s, a) pairs observed to lead there
+        self.predecessors = dict()
+        self.terminal = set()
+        self.queue = IndexedPriorityQueue()
+
+    def observe(self, state: int, action: int, reward: float, state_prime: int, terminal: bool):
+        key = state * self.num_actions + action
+        outcomes = self.outcomes.get(key)
+        if outcomes is None:
+            outcomes = dict()
+            self.outcomes[key] = outcomes
+            self.visits[key] = 0
+        outcome = outcomes.get(state_prime)
+        if outcome is None:
+            outcome = [0, 0.0]
+            outcomes[state_prime] = outcome
+            self.predecessors.setdefault(state_prime, set()).add(key)
+        outcome[0] += 1
+        outcome[1] += reward
+        self.visits[key] += 1
+        if terminal:
+            self.terminal.add(state_prime)
+
+        self._prioritize(key, self.table.writablevalues())
+
+    def plan(self):
+        """
+        Runs up to `planning_steps` backups, highest priority first.
+        """
+        values = self.table.writablevalues()
+        for i in range(0, self.planning_steps):
+            if len(self.queue) == 0:
+                break
+            key, priority = self.queue.pop()
+            state, action = divmod(key, self.num_actions)
+            values[state, action] += self.alpha * (self._backup(key, values) - values[state, action])
+
+            for predecessor in self.predecessors.get(state, ()):
+                self._prioritize(predecessor, values)
+
+    def _backup(self, key: int, values: np.ndarray) -> float:
+        target = 0.0
+        for (state_prime, (count, reward_sum)) in self.outcomes[key].items():
+            # Terminal states are defined to have value 0
+            value_prime = 0.0 if state_prime in self.terminal else values[state_prime].max()
+            target += reward_sum + count * self.gamma * value_prime
+        return target / self.visits[key]
+
+    def _prioritize(self, key: int, values: np.ndarray):
+        state, action = divmod(key, self.num_actions)
+        priority = abs(self._backup(key, values) - values[state, action])
+        if priority > self.threshold:
+            if key not in self.queue or self.queue.priorities[key] < priority:
+                self.queue.update(key, priority)
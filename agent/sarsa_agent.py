@@ -1,21 +1,26 @@
-import random
-
-from agent.state_action_value_table import StateActionValueTable
+from agent.prioritized_sweeping import PrioritizedSweepingPlanner
+from agent.state_action_value_table import StateActionValueTable, DenseStateActionValueTable, \
+    epsilon_greedy_expectation
 from gridworld import GridWorldState, GridWorldAction, Direction, Set
 from rl.action import Action
 from rl.agent import Agent
 from rl.domain import Domain
+from rl.random_streams import RandomStream
 from rl.state import State
 from rl.task import Task
 
 
 class SarsaAgent(Agent):
-    def __init__(self, domain: Domain, task: Task, epsilon=0.1, alpha=0.6, gamma=0.95, lamb=0.95, expected=False):
+    def __init__(self, domain: Domain, task: Task, epsilon=0.1, alpha=0.6, gamma=0.95, lamb=0.95, expected=False,
+                 dense_table=False, planning_steps=0, rng: RandomStream = None):
         """
         :param domain: The world the agent is placed in.
         :param task: The task in the world, which defines the reward function.
+        :param dense_table: Store values in an array indexed by the domain's state indexer instead of a dict.
+        :param planning_steps: Prioritized sweeping backups per environment step. Requires dense_table.
+        :param rng: The stream to draw from. Defaults to the shared default stream.
         """
-        super().__init__(domain, task)
+        super().__init__(domain, task, rng)
         self.world = domain
         self.task = task
         self.epsilon = epsilon
@@ -26,9 +31,18 @@ class SarsaAgent(Agent):
         self.previousaction = None
         self.previousstate = None
 
-        self.value_function = StateActionValueTable(domain.get_actions(domain.get_current_state()))
+        if dense_table:
+            indexer = domain.state_indexer()
+            self.value_function = DenseStateActionValueTable(domain.actions, indexer.number_of_states, indexer)
+        else:
+            self.value_function = StateActionValueTable(domain.get_actions(domain.get_current_state()))
         self.current_cumulative_reward = 0.0
 
+        self.planner = None
+        if planning_steps > 0:
+            assert dense_table, "The planning model is keyed by integer-encoded states"
+            self.planner = PrioritizedSweepingPlanner(self.value_function, alpha, gamma, planning_steps)
+
     def act(self):
         """Execute one action on the world, possibly terminating the episode.
 
@@ -72,41 +86,31 @@ class SarsaAgent(Agent):
         self.value_function.setactionvalue(state, action, new_value)
         self.current_cumulative_reward += reward
 
+        if self.planner is not None:
+            table = self.value_function
+            self.planner.observe(table.state_index(state), table.action_index[action], reward,
+                                 table.state_index(state_prime), terminal)
+            self.planner.plan()
+
     def choose_action(self, state) -> Action:
         """Given a state, pick an action according to an epsilon-greedy policy.
 
         :param state: The state from which to act.
         :return:
         """
-        if random.random() < self.epsilon:
+        if self.rng.random() < self.epsilon:
             actions = self.domain.get_actions(state)
-            return random.sample(actions, 1)[0]
+            return self.rng.choice(tuple(actions))
         else:
             best_actions = self.value_function.bestactions(state)
-            return random.sample(best_actions, 1)[0]
+            return self.rng.choice(best_actions)
 
     def expected_value(self, state):
-        actions = self.domain.get_actions(state)
-        expectation = 0.0
-        best_actions = self.value_function.bestactions(state)
-        num_best_actions = len(best_actions)
-        nonoptimal_mass = self.epsilon
-
-        if num_best_actions > 0:
-            a_best_action = random.sample(best_actions, 1)[0]
-            greedy_mass = (1.0 - self.epsilon)
-            expectation += greedy_mass * self.value_function.actionvalue(state, a_best_action)
-        else:
-            nonoptimal_mass = 1.0
-
-        if nonoptimal_mass > 0.0:
-            # No best action, equiprobable random policy
-            total_value = 0.0
-            for action in actions:
-                total_value += self.value_function.actionvalue(state, action)
-            expectation += nonoptimal_mass * total_value / len(actions)
-
-        return expectation
+        """
+        The value of `state` under the epsilon-greedy policy.
+        """
+        values = self.value_function.actionvalues(state)
+        return epsilon_greedy_expectation(values, self.epsilon)
 
     def get_cumulative_reward(self):
         return self.current_cumulative_reward
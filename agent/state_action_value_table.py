@@ -1,16 +1,28 @@
-from typing import Set
+import copy
+from typing import Callable, List, Set
+
+import numpy as np
 
 from rl.action import Action
+from rl.copy_on_write import CopyOnWriteDict
 from rl.state import State
 
 
 class StateActionValueTable:
     def __init__(self, actions: Set[Action]):
-        self.table = dict()
+        self.table = CopyOnWriteDict(copy_value=dict)
         self.actions = actions
 
     def reset(self):
-        self.table = dict()
+        self.table = CopyOnWriteDict(copy_value=dict)
+
+    def snapshot(self) -> "StateActionValueTable":
+        """
+        :return: A copy of the table, taken in constant time. See CopyOnWriteDict.
+        """
+        snapshot = copy.copy(self)
+        snapshot.table = self.table.snapshot()
+        return snapshot
 
     def actionvalue(self, state: State, action: Action) -> float:
         # What if its not in the table?
@@ -24,9 +36,18 @@ class StateActionValueTable:
         return self.table[state][action]
 
     def setactionvalue(self, state: State, action: Action, value: float):
-        self.table[state][action] = value
+        self.table.mutable(state)[action] = value
 
-    def bestactions(self, state: State) -> Set[Action]:
+    def actionvalues(self, state: State) -> np.ndarray:
+        """
+        :return: The values of every action in `state`, in the order of self.actions
+        """
+        entry = self.table.get(state)
+        if entry is None:
+            return np.zeros(len(self.actions))
+        return np.array([entry[action] for action in self.actions])
+
+    def bestactions(self, state: State) -> List[Action]:
         entry = self.table.get(state)
         if entry is None:
             entry = dict()
@@ -37,8 +58,114 @@ class StateActionValueTable:
         for (action, value) in entry.items():
             if value > best_value:
                 best_value = value
-                best_actions = {action}
+                best_actions = [action]
             elif value == best_value or abs(value - best_value) < 0.000001:
-                best_actions.add(action)
+                best_actions.append(action)
 
         return best_actions
+
+
+class DenseStateActionValueTable:
+    """
+    A state-action value table backed by a contiguous (num_states, num_actions)
+    array. States are addressed through `state_index`, which must map every
+    state to a distinct integer in [0, num_states).
+    """
+
+    def __init__(self, actions: List[Action], num_states: int, state_index: Callable[[State], int],
+                 initial_value=0.0, tolerance=0.000001):
+        self.actions = list(actions)
+        self.action_index = {action: i for (i, action) in enumerate(self.actions)}
+        self.num_states = num_states
+        self.state_index = state_index
+        self.initial_value = initial_value
+        self.tolerance = tolerance
+        self.values = None
+        self._shared = False
+        self.reset()
+
+    def reset(self):
+        self.values = np.full((self.num_states, len(self.actions)), self.initial_value)
+        self._shared = False
+
+    def snapshot(self) -> "DenseStateActionValueTable":
+        """
+        :return: A copy of the table, taken in constant time. Both tables share
+                 the value array until one of them writes to it.
+        """
+        snapshot = copy.copy(self)
+        snapshot._shared = True
+        self._shared = True
+        return snapshot
+
+    def writablevalues(self) -> np.ndarray:
+        """
+        :return: The value array, safe to modify in place
+        """
+        if self._shared:
+            self.values = self.values.copy()
+            self._shared = False
+        return self.values
+
+    def actionvalue(self, state: State, action: Action) -> float:
+        return self.values.item(self.state_index(state), self.action_index[action])
+
+    def setactionvalue(self, state: State, action: Action, value: float):
+        if self._shared:
+            self.writablevalues()
+        self.values[self.state_index(state), self.action_index[action]] = value
+
+    def actionvalues(self, state: State) -> np.ndarray:
+        """
+        :return: A view of the row holding the values of every action in `state`
+        """
+        return self.values[self.state_index(state)]
+
+    def bestactions(self, state: State) -> List[Action]:
+        # Rows are only as wide as the action set, so a single tolist() beats
+        # numpy's per-call overhead here. Use greedy_mask for batches of rows.
+        row = self.values[self.state_index(state)].tolist()
+        threshold = max(row) - self.tolerance
+        return [self.actions[i] for (i, value) in enumerate(row) if value >= threshold]
+
+
+def greedy_mask(values: np.ndarray, tolerance=0.000001) -> np.ndarray:
+    """
+    Marks the entries within `tolerance` of the maximum along the last axis.
+
+    :param values: A row of action values, or a batch of rows
+    :return: A boolean array shaped like `values`
+    """
+    best = values.max(axis=-1, keepdims=True)
+    return values >= best - tolerance
+
+
+def epsilon_greedy_probabilities(values: np.ndarray, epsilon: float, tolerance=0.000001) -> np.ndarray:
+    """
+    The epsilon-greedy policy over `values`, with the greedy mass split evenly
+    between tied actions.
+
+    :param values: A row of action values, or a batch of rows
+    :return: Action probabilities shaped like `values`
+    """
+    best = greedy_mask(values, tolerance)
+    return epsilon / values.shape[-1] + (1.0 - epsilon) * best / best.sum(axis=-1, keepdims=True)
+
+
+def epsilon_greedy_expectation(values: np.ndarray, epsilon: float, tolerance=0.000001):
+    """
+    The expected action value under epsilon_greedy_probabilities, the Expected
+    Sarsa target.
+
+    :param values: A row of action values, or a batch of rows
+    :return: A float for a row, an array with one entry per row for a batch
+    """
+    if values.ndim == 1:
+        # As in DenseStateActionValueTable.bestactions, a single short row is
+        # cheaper to reduce in Python than through several numpy calls
+        row = values.tolist()
+        threshold = max(row) - tolerance
+        best = [value for value in row if value >= threshold]
+        return epsilon * sum(row) / len(row) + (1.0 - epsilon) * sum(best) / len(best)
+    probabilities = epsilon_greedy_probabilities(values, epsilon, tolerance)
+    return np.einsum("ij,ij->i", probabilities, values)
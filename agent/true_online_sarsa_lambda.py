@@ -1,24 +1,28 @@
-import random
-
 import numpy as np
 
+from agent.state_action_value_table import epsilon_greedy_expectation
 from gridworld import GridWorldState, GridWorldAction, Direction
-from gridworld.feature_extractors import DiscretizedGridWorldState
+from gridworld.feature_extractors import DiscretizedGridWorldState, FeatureExtractor
 from rl.action import Action
 from rl.agent import Agent
 from rl.domain import Domain
+from rl.random_streams import RandomStream
 from rl.state import State
 from rl.task import Task
+from vfa.eligibility_traces import SparseEligibilityTraces
 from vfa.linear_vfa import LinearVFA
 
 
 class TrueOnlineSarsaLambda(Agent):
-    def __init__(self, domain: Domain, task: Task, epsilon=0.1, alpha=0.6, gamma=0.95, lamb=0.95, expected=False):
+    def __init__(self, domain: Domain, task: Task, epsilon=0.1, alpha=0.6, gamma=0.95, lamb=0.95, expected=False,
+                 feature_extractor: FeatureExtractor = None, rng: RandomStream = None):
         """
         :param domain: The world the agent is placed in.
         :param task: The task in the world, which defines the reward function.
+        :param feature_extractor: Defaults to a one-hot encoding of the agent's cell.
+        :param rng: The stream to draw from. Defaults to the shared default stream.
         """
-        super().__init__(domain, task)
+        super().__init__(domain, task, rng)
         self.world = domain
         self.task = task
         self.epsilon = epsilon
@@ -32,8 +36,19 @@ class TrueOnlineSarsaLambda(Agent):
 
         example_state = domain.get_current_state()
         actions = domain.get_actions(example_state)
-        self.feature_extractor = DiscretizedGridWorldState(example_state, GridWorldAction(Direction.up))
-        self.eligibility = np.zeros(self.feature_extractor.number_of_features)
+        if feature_extractor is None:
+            feature_extractor = DiscretizedGridWorldState(example_state, GridWorldAction(Direction.up))
+        self.feature_extractor = feature_extractor
+        if self.feature_extractor.sparse:
+            self.traces = SparseEligibilityTraces(self.feature_extractor.number_of_features)
+        else:
+            number_of_features = self.feature_extractor.number_of_features
+            self.eligibility = np.zeros(number_of_features)
+            # Preallocated buffers so that dense updates don't allocate
+            self._features = np.zeros(number_of_features)
+            self._features_prime = np.zeros(number_of_features)
+            self._scratch = np.zeros(number_of_features)
+            self._clear_mask = np.zeros(number_of_features, dtype=bool)
         self.value_function = LinearVFA(self.feature_extractor.number_of_features, actions)
         self.current_cumulative_reward = 0.0
 
@@ -62,12 +77,16 @@ class TrueOnlineSarsaLambda(Agent):
 
     def update(self, state: State, action: Action, state_prime: State, action_prime: Action, value_old: float,
                terminal=False):
+        if self.feature_extractor.sparse:
+            return self._update_sparse(state, action, state_prime, action_prime, value_old, terminal)
+
         reward = self.task.reward(state, action, state_prime)
 
-        state_weights = np.array(self.value_function.weightsfor(action))
-        state_features = np.array(self.feature_extractor.extract(state, action))
+        # Everything below works in place on the weight row and the scratch buffers
+        state_weights = self.value_function.writableweightsfor(action)
+        state_features = self.feature_extractor.extract_into(state, action, self._features)
+        scratch = self._scratch
 
-        value_prime = np.dot(state_weights, state_features)
         value = np.dot(state_weights, state_features)
 
         self._update_traces(state_features)
@@ -79,39 +98,77 @@ class TrueOnlineSarsaLambda(Agent):
                 value_prime = self.expected_value(state_prime)
 
             else:
-                state_prime_features = np.array(self.feature_extractor.extract(state_prime, action_prime))
+                state_prime_features = self.feature_extractor.extract_into(state_prime, action_prime,
+                                                                           self._features_prime)
                 value_prime = np.dot(state_weights, state_prime_features)
 
         delta = reward + self.gamma * value_prime - value
-        weights_target = delta * self.eligibility + self.alpha * (
-            value - np.dot(state_weights, state_features)) * state_features
-        updated_weights = state_weights + weights_target
+        correction = self.alpha * (value - np.dot(state_weights, state_features))
+        np.multiply(self.eligibility, delta, out=scratch)
+        np.add(state_weights, scratch, out=state_weights)
+        np.multiply(state_features, correction, out=scratch)
+        np.add(state_weights, scratch, out=state_weights)
 
-        # updated_weights = self._clear_weights(updated_weights)
-        self.value_function.updateweightsfor(updated_weights, action)
-        value_old = self.value_function.actionvalue(state_features, action)
+        # self._clear_weights(state_weights)
+        value_old = np.dot(state_weights, state_features)
 
         self.current_cumulative_reward += reward
 
         self._eligibility_clear()
         return value_old
 
+    def _update_sparse(self, state: State, action: Action, state_prime: State, action_prime: Action,
+                       value_old: float, terminal=False):
+        """
+        The same update as update(), over the indices of the active binary
+        features instead of dense feature vectors. Only traced weights are touched.
+        """
+        reward = self.task.reward(state, action, state_prime)
+
+        state_weights = self.value_function.weightsfor(action)
+        active = self.feature_extractor.extract_sparse(state, action)
+
+        value = state_weights[active].sum()
+
+        self.traces.update(active, self.alpha, self.gamma * self.lamb)
+        # Terminal states are defined to have value 0
+        if terminal:
+            value_prime = 0
+        else:
+            if self.expected:
+                value_prime = self.expected_value(state_prime)
+
+            else:
+                active_prime = self.feature_extractor.extract_sparse(state_prime, action_prime)
+                value_prime = state_weights[active_prime].sum()
+
+        delta = reward + self.gamma * value_prime - value
+        correction = self.alpha * (value - state_weights[active].sum())
+        weights = self.value_function.writableweightsfor(action)
+        self.traces.add_scaled_to(weights, delta)
+        weights[active] += correction
+
+        value_old = self.value_function.sparseactionvalue(active, action)
+
+        self.current_cumulative_reward += reward
+
+        self.traces.prune()
+        return value_old
+
     def _clear_weights(self, weights):
-        for i in range(0, len(weights)):
-            if weights[i] < 0.000001:
-                weights[i] = 0.0
+        np.copyto(weights, 0.0, where=weights < 0.000001)
         return weights
 
     def _update_traces(self, state_features):
-        discounted_eligibility = self.gamma * self.lamb * self.eligibility
-        eligibility_target = self.alpha * (1 - self.gamma * self.lamb * np.dot(self.eligibility,
-                                                                               state_features)) * state_features
-        self.eligibility = discounted_eligibility + eligibility_target
+        gamma_lambda = self.gamma * self.lamb
+        increment = self.alpha * (1 - gamma_lambda * np.dot(self.eligibility, state_features))
+        np.multiply(self.eligibility, gamma_lambda, out=self.eligibility)
+        np.multiply(state_features, increment, out=self._scratch)
+        np.add(self.eligibility, self._scratch, out=self.eligibility)
 
     def _eligibility_clear(self):
-        for i in range(0, len(self.eligibility)):
-            if self.eligibility[i] < 0.00001:
-                self.eligibility[i] = 0.0
+        np.less(self.eligibility, 0.00001, out=self._clear_mask)
+        np.copyto(self.eligibility, 0.0, where=self._clear_mask)
 
     def choose_action(self, state) -> Action:
         """Given a state, pick an action according to an epsilon-greedy policy.
@@ -119,35 +176,20 @@ class TrueOnlineSarsaLambda(Agent):
         :param state: The state from which to act.
         :return:
         """
-        if random.random() < self.epsilon:
+        if self.rng.random() < self.epsilon:
             actions = self.domain.get_actions(state)
-            return random.sample(actions, 1)[0]
+            return self.rng.choice(tuple(actions))
         else:
             best_actions = self.value_function.bestactions(state, self.feature_extractor)
-            return random.sample(best_actions, 1)[0]
+            return self.rng.choice(best_actions)
 
     def expected_value(self, state):
-        actions = self.domain.get_actions(state)
-        expectation = 0.0
-        best_actions = self.value_function.bestactions(state)
-        num_best_actions = len(best_actions)
-        nonoptimal_mass = self.epsilon
-
-        if num_best_actions > 0:
-            a_best_action = random.sample(best_actions, 1)[0]
-            greedy_mass = (1.0 - self.epsilon)
-            expectation += greedy_mass * self.value_function.actionvalue(state, a_best_action)
-        else:
-            nonoptimal_mass = 1.0
-
-        if nonoptimal_mass > 0.0:
-            # No best action, equiprobable random policy
-            total_value = 0.0
-            for action in actions:
-                total_value += self.value_function.actionvalue(state, action)
-            expectation += nonoptimal_mass * total_value / len(actions)
-
-        return expectation
+        """
+        The value of `state` under the epsilon-greedy policy, with the greedy
+        mass split evenly between tied actions.
+        """
+        values = self.value_function.stateactionvalues(state, self.feature_extractor)
+        return epsilon_greedy_expectation(values, self.epsilon, tolerance=0.0)
 
     def get_cumulative_reward(self):
         return self.current_cumulative_reward
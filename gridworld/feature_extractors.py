@@ -1,12 +1,19 @@
 from math import ceil, floor
 from typing import List
 
+import numpy as np
+
 from rl.action import Action
 from rl.state import State
 from .gridworld import GridWorldState, GridWorldAction, Direction
 
 
 class FeatureExtractor:
+    # Whether extract_sparse is the preferred representation
+    sparse = False
+    # Whether features vary with the action, rather than describing the state alone
+    action_dependent = False
+
     def __init__(self):
         ()
 
@@ -16,8 +23,24 @@ class FeatureExtractor:
     def extract(self, state: State, action: Action) -> List[float]:
         raise Exception("Should've implemented this")
 
+    def extract_sparse(self, state: State, action: Action) -> np.ndarray:
+        """
+        Binary features as the indices of the active ones. Only meaningful for
+        extractors whose features are all 0 or 1.
+        """
+        return np.flatnonzero(self.extract(state, action))
+
+    def extract_into(self, state: State, action: Action, out: np.ndarray) -> np.ndarray:
+        """
+        Writes the features into the preallocated array `out` and returns it.
+        """
+        out[:] = self.extract(state, action)
+        return out
+
 
 class DiscretizedGridWorldState(FeatureExtractor):
+    sparse = True
+
     def __init__(self, start_state: GridWorldState, start_action: GridWorldAction):
         self.number_of_features = len(self.extract(start_state, start_action))
 
@@ -29,8 +52,18 @@ class DiscretizedGridWorldState(FeatureExtractor):
         phi += bin_x_y(state, 1)
         return phi
 
+    def extract_sparse(self, state: GridWorldState, action: GridWorldAction) -> np.ndarray:
+        return np.array([bin_x_y_index(state, 1)])
+
+    def extract_into(self, state: GridWorldState, action: GridWorldAction, out: np.ndarray) -> np.ndarray:
+        out.fill(0.0)
+        out[bin_x_y_index(state, 1)] = 1.0
+        return out
+
 
 class DiscretizedGridWorldStateAction(FeatureExtractor):
+    action_dependent = True
+
     def __init__(self, start_state: GridWorldState, start_action: GridWorldAction):
         self.number_of_features = len(self.extract(start_state, start_action))
 
@@ -58,6 +91,73 @@ class DiscretizedGridWorldStateAction(FeatureExtractor):
         return phi
 
 
+class TileCodingGridWorldState(FeatureExtractor):
+    """
+    Tile coding over grid coordinates: `num_tilings` grids of `tile_size` square
+    tiles, each offset by a fraction of a tile, so that each state activates one
+    tile per tiling. With `hash_size`, tiles are hashed into a table of that many
+    features, which bounds memory regardless of the size of the map.
+    """
+    sparse = True
+
+    def __init__(self, width: int, height: int, num_tilings=8, tile_size=4, hash_size: int = None):
+        self.num_tilings = num_tilings
+        self.tile_size = tile_size
+        self.hash_size = hash_size
+
+        # Asymmetric (1, 3) displacements avoid tilings lining up along the diagonal
+        step = tile_size / num_tilings
+        tilings = np.arange(0, num_tilings)
+        self.offsets_x = (tilings * step) % tile_size
+        self.offsets_y = (tilings * 3 * step) % tile_size
+        self.tilings = tilings
+
+        self.tiles_x = ceil(width / tile_size) + 1
+        self.tiles_y = ceil(height / tile_size) + 1
+        if hash_size is None:
+            self.number_of_features = num_tilings * self.tiles_x * self.tiles_y
+        else:
+            self.number_of_features = hash_size
+
+    def num_features(self):
+        return self.number_of_features
+
+    def extract(self, state: GridWorldState, action: GridWorldAction) -> List[float]:
+        return self.extract_into(state, action, np.zeros(self.number_of_features))
+
+    def extract_into(self, state: GridWorldState, action: GridWorldAction, out: np.ndarray) -> np.ndarray:
+        out.fill(0.0)
+        out[self.extract_sparse(state, action)] = 1.0
+        return out
+
+    def extract_sparse(self, state: GridWorldState, action: GridWorldAction) -> np.ndarray:
+        indices = self.extract_batch(np.array([state.x]), np.array([state.y]))[0]
+        if self.hash_size is not None:
+            # Two tilings may hash to the same feature; it is still a single binary feature
+            indices = np.unique(indices)
+        return indices
+
+    def extract_batch(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Active tiles for a batch of coordinates.
+
+        :return: An (N, num_tilings) integer array of feature indices
+        """
+        tile_x = np.floor((xs[:, np.newaxis] + self.offsets_x) / self.tile_size).astype(np.int64)
+        tile_y = np.floor((ys[:, np.newaxis] + self.offsets_y) / self.tile_size).astype(np.int64)
+        if self.hash_size is None:
+            return (self.tilings * self.tiles_y + tile_y) * self.tiles_x + tile_x
+        return hash_tiles(self.tilings, tile_x, tile_y, self.hash_size)
+
+
+def hash_tiles(tilings: np.ndarray, tile_x: np.ndarray, tile_y: np.ndarray, hash_size: int) -> np.ndarray:
+    """
+    A deterministic spatial hash of tile coordinates into [0, hash_size).
+    """
+    hashed = (tilings * 73856093) ^ (tile_x * 19349663) ^ (tile_y * 83492791)
+    return hashed % hash_size
+
+
 def bin_x_y(state: GridWorldState, square_size: int) -> List[float]:
     result = []
     map_width = len(state.map[0])
@@ -77,3 +177,12 @@ def bin_x_y(state: GridWorldState, square_size: int) -> List[float]:
                 result.append(0.0)
 
     return result
+
+
+def bin_x_y_index(state: GridWorldState, square_size: int) -> int:
+    """
+    The index of the single feature bin_x_y sets for `state`.
+    """
+    map_height = len(state.map[1])
+    max_bin_y = ceil(map_height / square_size)
+    return floor(state.x / square_size) * max_bin_y + floor(state.y / square_size)
@@ -0,0 +1,51 @@
+import numpy as np
+import scipy.ndimage
+
+from .gridworld import GridWorld, GridItem
+
+
+def random_gridworld(width: int, height: int, seed: int = None, wall_density=0.2, pit_density=0.01, num_exits=1,
+                     max_wind=0, per_cell_wind=False, stochasticity=0.0) -> GridWorld:
+    """
+    Generates a grid world with randomly placed walls, pits and exits. The
+    agent starts at the middle of the left edge, and exits are only placed
+    where plain moves from the start can reach them without crossing a pit.
+    Walls and pits stop the wind as they stop moves, so with windless cells,
+    or wind that can be calm, such an exit is reachable. Strong wind without
+    a calm outcome can still push the agent past every route to it.
+    Generation is vectorized, so maps of a million cells take well under a
+    second.
+
+    :param seed: Seeds the generator; equal seeds give equal maps
+    :param max_wind: Wind strengths are drawn uniformly from [0, max_wind]. No wind if 0
+    :param per_cell_wind: Draw a strength for every cell instead of every column
+    """
+    rng = np.random.default_rng(seed)
+    start_x = 0
+    start_y = height // 2
+
+    walls = rng.random((height, width)) < wall_density
+    pits = ~walls & (rng.random((height, width)) < pit_density)
+    walls[start_y, start_x] = False
+    pits[start_y, start_x] = False
+
+    # Label the open cells connected to the start by up/down/left/right moves
+    components, num_components = scipy.ndimage.label(~walls & ~pits)
+    reachable = components == components[start_y, start_x]
+    reachable[start_y, start_x] = False
+    candidates = np.flatnonzero(reachable)
+    if len(candidates) < num_exits:
+        raise ValueError("Only " + str(len(candidates)) + " cells are reachable from the start")
+    exits = rng.choice(candidates, num_exits, replace=False)
+
+    wind_strengths = None
+    if max_wind > 0:
+        shape = (height, width) if per_cell_wind else width
+        wind_strengths = rng.integers(0, max_wind + 1, shape)
+
+    domain = GridWorld(width, height, start_x, start_y, wind=max_wind > 0, wind_strengths=wind_strengths,
+                       stochasticity=stochasticity)
+    domain.map[walls] = GridItem.wall
+    domain.map[pits] = GridItem.pit
+    domain.map.flat[exits] = GridItem.exit
+    return domain
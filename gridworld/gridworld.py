@@ -1,9 +1,11 @@
-import random
-from enum import Enum
-from typing import List, Set
+from enum import Enum, IntEnum
+from typing import List, Set, Tuple
+
+import numpy as np
 
 from rl.action import Action
 from rl.domain import Domain
+from rl.random_streams import RandomStream, default_stream
 from rl.state import State
 from rl.task import Task
 
@@ -28,27 +30,55 @@ class Direction(Enum):
             return "left"
 
 
-class GridItem(Enum):
+class GridItem(IntEnum):
     empty = 0
     pit = 1
     exit = 2
+    wall = 3
+
+
+# Displacement for each action, indexed by Direction value
+_action_dx = np.array([0, 1, 0, -1])
+_action_dy = np.array([1, 0, -1, 0])
 
 
 class GridWorldState(State):
-    def __init__(self, x: int, y: int, map: List[List[int]]):
-        self.x = x
-        self.y = y
-        self.map = map
+    """
+    A cell of a grid world. States are immutable, and GridWorld hands out one
+    shared instance per cell, so comparing them is usually an identity check.
+    """
+    __slots__ = ("x", "y", "map", "_hash")
+
+    def __init__(self, x: int, y: int, map: np.ndarray):
+        object.__setattr__(self, "x", x)
+        object.__setattr__(self, "y", y)
+        object.__setattr__(self, "map", map)
+        # Row-major cell index, which is unique within a map
+        object.__setattr__(self, "_hash", y * len(map[0]) + x)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GridWorldState is immutable")
 
     def __hash__(self):
-        return len(self.map) * self.y + self.x
+        return self._hash
 
     def __eq__(self, other):
+        if other is self:
+            return True
         # Assumes two states have the same map!
         if isinstance(other, GridWorldState):
-            return other.__hash__() == self.__hash__()
+            return other._hash == self._hash
         return False
 
+    def __reduce__(self):
+        return GridWorldState, (self.x, self.y, self.map)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def __str__(self):
         return str(self.x) + ", " + str(self.y)
         result = "_" * len(self.map[0]) * 3
@@ -70,105 +100,280 @@ class GridWorldState(State):
 
 
 class GridWorldAction(Action):
-    def __init__(self, direction: Direction):
-        super().__init__()
-        self.direction = direction
+    """
+    A move in one direction. There is a single, immutable instance per
+    direction; constructing an action returns it.
+    """
+    __slots__ = ("direction",)
+    _interned = {}
+
+    def __new__(cls, direction: Direction):
+        action = cls._interned.get(direction)
+        if action is None:
+            action = super().__new__(cls)
+            object.__setattr__(action, "direction", direction)
+            cls._interned[direction] = action
+        return action
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GridWorldAction is immutable")
 
     def __hash__(self):
-        return self.direction.__hash__()
+        # Enum members hash by name, which varies between processes; the value
+        # keeps action set order, and so seeded trials, the same everywhere.
+        return self.direction.value
 
     def __eq__(self, other):
-        # Assumes two states have the same map!
+        if other is self:
+            return True
         if isinstance(other, GridWorldAction):
-            return other.__hash__() == self.__hash__()
+            return other.direction == self.direction
         return False
 
+    def __reduce__(self):
+        return GridWorldAction, (self.direction,)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def __str__(self):
         return self.direction.__str__()
 
 
 class GridWorld(Domain):
+    """
+    A grid of cells held in a (height, width) array of GridItem values. Walls
+    block movement, including the wind's, and exits and pits end the episode. The wind pushes the
+    agent up by a strength given per column, or per cell as a (height, width)
+    array, and a die roll weakens or strengthens it according to
+    `stochasticity`.
+    """
+
     def __init__(self, width: int, height: int, agent_x_start: int, agent_y_start: int, wind=False,
-                 wind_strengths=None, stochasticity=1.0):
-        self.map = [[0] * width for _ in range(0, height)]
+                 wind_strengths=None, stochasticity=1.0, rng: RandomStream = None):
+        """
+        :param rng: The stream wind gusts are drawn from. Defaults to the shared default stream.
+        """
+        self.map = np.full((height, width), GridItem.empty, dtype=np.int8)
         self.width = width
         self.height = height
         self.agent_x = agent_x_start
         self.agent_y = agent_y_start
         self.actions = [GridWorldAction(Direction.up), GridWorldAction(Direction.right),
                         GridWorldAction(Direction.down), GridWorldAction(Direction.left)]
+        self.action_set = frozenset(self.actions)
+        # Interned states by row-major cell index, created on first use
+        self.states = [None] * (width * height)
         self.wind = wind
         self.wind_strengths = wind_strengths
         self.agent_start_x = agent_x_start
         self.agent_start_y = agent_y_start
 
         self.stochasticity = stochasticity
+        self.rng = rng if rng is not None else default_stream()
+        # Wind strength of every cell; zero everywhere without wind
+        self.wind_field = np.zeros((height, width), dtype=int)
         if self.wind:
-            assert len(wind_strengths) == width
+            strengths = np.asarray(wind_strengths, dtype=int)
+            if strengths.ndim == 1:
+                assert len(wind_strengths) == width
+            else:
+                assert strengths.shape == (height, width)
+            self.wind_field[:] = strengths
 
     def get_actions(self, state: State) -> Set[Action]:
-        return {GridWorldAction(Direction.up), GridWorldAction(Direction.right), GridWorldAction(Direction.down),
-                GridWorldAction(Direction.left)}
+        return self.action_set
 
     def apply_action(self, action: Action):
         assert isinstance(action, GridWorldAction)
 
-        if self.wind:
-            strength = self.wind_strengths[self.agent_x]
-            if strength > 0:
-                die_roll = random.random() * 3.0
-                if die_roll < 0 + self.stochasticity:
-                    strength -= 1
-                elif die_roll > 3 - self.stochasticity:
-                    strength += 1
-                else:
-                    strength = 0
-
-        # Move the agent
-        if action.direction is Direction.up:
-            self.agent_y += 1
-        elif action.direction is Direction.right:
-            self.agent_x += 1
-        elif action.direction is Direction.down:
-            self.agent_y -= 1
-        elif action.direction is Direction.left:
-            self.agent_x -= 1
-
-        if self.wind:
-            self.agent_y += strength
-
-        # Clamp
-        if self.agent_x < 0:
-            self.agent_x = 0
-        if self.agent_y < 0:
-            self.agent_y = 0
-
-        if self.agent_x >= self.width:
-            self.agent_x = self.width - 1
-        if self.agent_y >= self.height:
-            self.agent_y = self.height - 1
+        strength = self.wind_field.item(self.agent_y, self.agent_x)
+        if strength > 0:
+            die_roll = self.rng.random() * 3.0
+            if die_roll < 0 + self.stochasticity:
+                strength -= 1
+            elif die_roll > 3 - self.stochasticity:
+                strength += 1
+            else:
+                strength = 0
+
+        self.agent_x, self.agent_y = self.next_position(self.agent_x, self.agent_y, action.direction, strength)
+
+    def next_position(self, x: int, y: int, direction: Direction, wind_strength: int) -> Tuple[int, int]:
+        """
+        The deterministic part of the dynamics: where an agent at (x, y) ends up
+        after moving in `direction` and being pushed up by `wind_strength`.
+
+        The move and then the wind are taken one cell at a time. A move into a
+        wall doesn't happen, the wind stops below the first wall in its way,
+        and an agent that enters a pit stays in it. Exits only end the episode
+        if the agent lands on them, so the wind can carry it past one.
+        """
+        dx = int(_action_dx[direction.value])
+        dy = int(_action_dy[direction.value])
+        # Where the move would put the agent, before clamping to the grid
+        moved_y = y + dy
+        move_x = min(max(x + dx, 0), self.width - 1)
+        move_y = min(max(moved_y, 0), self.height - 1)
+        if self.map.item(move_y, move_x) == GridItem.wall:
+            moved_y = y
+        else:
+            x = move_x
+            y = move_y
+            if self.map.item(y, x) == GridItem.pit:
+                return x, y
+
+        target_y = min(max(moved_y + wind_strength, 0), self.height - 1)
+        while y < target_y:
+            item = self.map.item(y + 1, x)
+            if item == GridItem.wall:
+                break
+            y += 1
+            if item == GridItem.pit:
+                break
+        return x, y
+
+    def next_positions(self, x: np.ndarray, y: np.ndarray, directions: np.ndarray,
+                       wind_strengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        next_position for arrays of positions, Direction values and wind strengths.
+        """
+        walls = self.map == GridItem.wall
+        pits = self.map == GridItem.pit
+        moved_y = y + _action_dy[directions]
+        move_x = np.clip(x + _action_dx[directions], 0, self.width - 1)
+        move_y = np.clip(moved_y, 0, self.height - 1)
+        blocked = walls[move_y, move_x]
+        moved_y = np.where(blocked, y, moved_y)
+        x = np.where(blocked, x, move_x)
+        y = np.where(blocked, y, move_y)
+        stopped = ~blocked & pits[y, x]
+
+        # Push every agent up a cell at a time until its wind is spent
+        target_y = np.clip(moved_y + wind_strengths, 0, self.height - 1)
+        active = ~stopped & (y < target_y)
+        while active.any():
+            above = np.minimum(y + 1, self.height - 1)
+            rising = active & ~walls[above, x]
+            y = np.where(rising, above, y)
+            active = rising & (y < target_y) & ~pits[y, x]
+        return x, y
+
+    def wind_probabilities(self) -> Tuple[float, float, float]:
+        """
+        :return: The probabilities that the wind in a windy cell is one weaker,
+                 one stronger, or calm
+        """
+        # The die roll is uniform over [0, 3); the lower branch is checked first
+        weaker = min(max(self.stochasticity, 0.0), 3.0) / 3.0
+        stronger = max(0.0, 3.0 - max(self.stochasticity, 3.0 - self.stochasticity)) / 3.0
+        calm = max(0.0, 1.0 - weaker - stronger)
+        return weaker, stronger, calm
+
+    def wind_outcomes(self, x: int, y: int) -> List[Tuple[int, float]]:
+        """
+        The distribution apply_action samples the wind from in cell (x, y).
+
+        :return: (strength, probability) pairs with non-zero probability
+        """
+        strength = self.wind_field.item(y, x)
+        if strength <= 0:
+            return [(0, 1.0)]
+
+        weaker, stronger, calm = self.wind_probabilities()
+        outcomes = [(strength - 1, weaker), (strength + 1, stronger), (0, calm)]
+        return [(s, p) for (s, p) in outcomes if p > 0.0]
 
     def get_current_state(self) -> GridWorldState:
-        return GridWorldState(self.agent_x, self.agent_y, self.map)
+        return self.state_at(self.agent_x, self.agent_y)
+
+    def state_at(self, x: int, y: int) -> GridWorldState:
+        """
+        :return: The shared state object for cell (x, y)
+        """
+        index = y * self.width + x
+        state = self.states[index]
+        if state is None:
+            state = GridWorldState(x, y, self.map)
+            self.states[index] = state
+        return state
 
     def reset(self):
         self.agent_x = self.agent_start_x
         self.agent_y = self.agent_start_y
 
     def place_exit(self, x: int, y: int):
-        self.map[y][x] = GridItem.exit
+        self.map[y, x] = GridItem.exit
+
+    def place_pit(self, x: int, y: int):
+        self.map[y, x] = GridItem.pit
+
+    def place_wall(self, x: int, y: int):
+        self.map[y, x] = GridItem.wall
+
+    def terminal_mask(self) -> np.ndarray:
+        """
+        :return: A (height, width) boolean array marking the cells that end an episode
+        """
+        return (self.map == GridItem.exit) | (self.map == GridItem.pit)
+
+    def state_indexer(self) -> "GridWorldStateIndexer":
+        return GridWorldStateIndexer(self.width, self.height)
+
+
+class GridWorldStateIndexer:
+    """
+    Maps grid world states to dense, collision-free integer codes in row-major
+    order, so that tabular learners can address plain arrays.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.number_of_states = width * height
+
+    def __call__(self, state: GridWorldState) -> int:
+        return state.y * self.width + state.x
+
+    def state_for(self, index: int, map: np.ndarray) -> GridWorldState:
+        return GridWorldState(index % self.width, index // self.width, map)
 
 
 class ReachExit(Task):
+    def __init__(self, domain: GridWorld, pit_reward=-100):
+        super().__init__(domain)
+        self.pit_reward = pit_reward
+
     def reward(self, state, action, state_prime) -> float:
         if state.x == state_prime.x and state.y == state_prime.y:
             return -1
             # return -5
-        elif self.domain.map[state_prime.y][state_prime.x] == GridItem.exit:
+        item = self.domain.map.item(state_prime.y, state_prime.x)
+        if item == GridItem.exit:
             return 20
+        elif item == GridItem.pit:
+            return self.pit_reward
         else:
             return -1
 
+    def rewards(self, x: np.ndarray, y: np.ndarray, x_prime: np.ndarray, y_prime: np.ndarray) -> np.ndarray:
+        """
+        reward() for arrays of transitions between cells.
+        """
+        moved = (x_prime != x) | (y_prime != y)
+        items = self.domain.map[y_prime, x_prime]
+        rewards = np.where(items == GridItem.exit, 20.0, np.where(items == GridItem.pit, float(self.pit_reward), -1.0))
+        return np.where(moved, rewards, -1.0)
+
     def stateisfinal(self, state) -> bool:
-        item = self.domain.map[state.y][state.x]
+        item = self.domain.map.item(state.y, state.x)
         return item == GridItem.exit or item == GridItem.pit
+
+    def terminal_mask(self) -> np.ndarray:
+        """
+        stateisfinal() for every cell, as a (height, width) boolean array.
+        """
+        return self.domain.terminal_mask()
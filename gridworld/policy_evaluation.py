@@ -0,0 +1,70 @@
+import numpy as np
+
+from agent.state_action_value_table import DenseStateActionValueTable
+from gridworld.feature_extractors import FeatureExtractor
+from rl.dynamic_programming import evaluate_policy, evaluate_policies, greedy_policy
+from rl.tabular_model import TabularModel
+from .gridworld import GridWorld
+
+
+def greedy_action_values(value_function, domain: GridWorld, feature_extractor: FeatureExtractor = None) -> np.ndarray:
+    """
+    Tabulates a value function over every cell of `domain`.
+
+    :param value_function: A state-action value table, or a LinearVFA if `feature_extractor` is given
+    :return: A (num_states, num_actions) array with actions in the order of `domain.actions`
+    """
+    if isinstance(value_function, DenseStateActionValueTable) and value_function.actions == domain.actions:
+        return value_function.values.copy()
+
+    indexer = domain.state_indexer()
+    action_values = np.zeros((indexer.number_of_states, len(domain.actions)))
+    for s in range(0, indexer.number_of_states):
+        state = indexer.state_for(s, domain.map)
+        if feature_extractor is not None:
+            values = value_function.stateactionvalues(state, feature_extractor)
+            for (a, action) in enumerate(domain.actions):
+                action_values[s, a] = values[value_function.action_index[action]]
+        else:
+            for (a, action) in enumerate(domain.actions):
+                action_values[s, a] = value_function.actionvalue(state, action)
+    return action_values
+
+
+def expected_greedy_return(value_function, domain: GridWorld, model: TabularModel,
+                           feature_extractor: FeatureExtractor = None, horizon: int = None, gamma=1.0) -> float:
+    """
+    The exact expected return, from the domain's start cell, of acting greedily
+    with respect to `value_function`. Ties are split evenly, as the agents break
+    them uniformly at random.
+
+    :param model: The domain's compiled model, see gridworld.transition_model
+    :param horizon: Only count the first `horizon` steps, like a capped rollout
+    :return: The expected return, or nan if the policy may never terminate
+    """
+    action_values = greedy_action_values(value_function, domain, feature_extractor)
+    # Tables treat values within a small tolerance as ties, LinearVFA only exact ones
+    tolerance = 0.0 if feature_extractor is not None else 0.000001
+    return _greedy_return(action_values, domain, model, tolerance, horizon, gamma)
+
+
+def expected_greedy_returns(action_values: np.ndarray, domain: GridWorld, model: TabularModel, horizon: int,
+                            gamma=1.0, tolerance=0.000001) -> np.ndarray:
+    """
+    expected_greedy_return for a batch of tables, evaluated together.
+
+    :param action_values: A (num_tables, num_states, num_actions) array with actions in the order of `domain.actions`
+    :return: The expected return of each table's greedy policy
+    """
+    policies = greedy_policy(action_values, tolerance)
+    values = evaluate_policies(model, policies, gamma, horizon)
+    start = domain.state_at(domain.agent_start_x, domain.agent_start_y)
+    return values[:, domain.state_indexer()(start)]
+
+
+def _greedy_return(action_values: np.ndarray, domain: GridWorld, model: TabularModel, tolerance: float,
+                   horizon: int, gamma: float) -> float:
+    policy = greedy_policy(action_values, tolerance)
+    values = evaluate_policy(model, policy, gamma, horizon)
+    start = domain.state_at(domain.agent_start_x, domain.agent_start_y)
+    return float(values[domain.state_indexer()(start)])
@@ -0,0 +1,58 @@
+import numpy as np
+import scipy.sparse
+
+from rl.tabular_model import TabularModel
+from .gridworld import GridWorld, ReachExit
+
+
+def compile_model(domain: GridWorld, task: ReachExit) -> TabularModel:
+    """
+    Builds the exact tabular model of a (windy) grid world's dynamics, for
+    every cell and action at once. States are numbered by the domain's state
+    indexer and actions follow the order of `domain.actions`.
+    """
+    num_states = domain.state_indexer().number_of_states
+
+    terminal = task.terminal_mask().ravel()
+    # Row-major cell codes, matching GridWorldStateIndexer
+    states = np.flatnonzero(~terminal)
+    x = states % domain.width
+    y = states // domain.width
+    strength = domain.wind_field[y, x]
+    windy = strength > 0
+
+    # Calm cells have a single outcome; windy ones one per non-zero wind probability
+    weaker, stronger, calm = domain.wind_probabilities()
+    outcomes = [(np.where(windy, strength - 1, 0), np.where(windy, weaker, 1.0)),
+                (strength + 1, np.where(windy, stronger, 0.0)),
+                (np.zeros_like(strength), np.where(windy, calm, 0.0))]
+
+    transitions = []
+    transition_rewards = []
+    shape = (num_states, num_states)
+    for (a, action) in enumerate(domain.actions):
+        rows = []
+        cols = []
+        probabilities = []
+        rewards = []
+        directions = np.full(len(states), action.direction.value)
+        for (wind_strengths, probability) in outcomes:
+            possible = probability > 0.0
+            x_prime, y_prime = domain.next_positions(x[possible], y[possible], directions[possible],
+                                                     wind_strengths[possible])
+            rows.append(states[possible])
+            cols.append(y_prime * domain.width + x_prime)
+            probabilities.append(probability[possible])
+            rewards.append(task.rewards(x[possible], y[possible], x_prime, y_prime))
+        rows = np.concatenate(rows)
+        cols = np.concatenate(cols)
+
+        # Outcomes that land in the same cell are summed by the conversion
+        transitions.append(scipy.sparse.coo_matrix((np.concatenate(probabilities), (rows, cols)),
+                                                   shape=shape).tocsr())
+        # Rewards only depend on (s, a, s'), so keep one entry per landing cell
+        _, first = np.unique(rows * num_states + cols, return_index=True)
+        transition_rewards.append(scipy.sparse.coo_matrix(
+            (np.concatenate(rewards)[first], (rows[first], cols[first])), shape=shape).tocsr())
+
+    return TabularModel(transitions, transition_rewards, terminal)
@@ -0,0 +1,87 @@
+import numpy as np
+
+from rl.random_streams import spawn_generator
+from .gridworld import GridWorld, ReachExit
+
+
+class VectorGridWorld:
+    """
+    Steps `num_envs` independent copies of a GridWorld at once. Agent positions
+    live in integer arrays and actions are given as Direction values, so a whole
+    batch of transitions costs a handful of array operations.
+
+    Dynamics match GridWorld.apply_action and rewards come from `task`.
+    """
+
+    def __init__(self, domain: GridWorld, num_envs: int, rng: np.random.Generator = None, task: ReachExit = None):
+        """
+        :param task: Defaults to ReachExit on `domain`
+        """
+        self.domain = domain
+        self.task = task if task is not None else ReachExit(domain)
+        self.num_envs = num_envs
+        self.width = domain.width
+        self.height = domain.height
+        self.start_x = domain.agent_start_x
+        self.start_y = domain.agent_start_y
+        self.stochasticity = domain.stochasticity
+        self.rng = rng if rng is not None else spawn_generator()
+
+        self.wind_field = domain.wind_field
+        self.terminals = self.task.terminal_mask()
+
+        self.x = np.full(num_envs, self.start_x, dtype=int)
+        self.y = np.full(num_envs, self.start_y, dtype=int)
+
+    def reset(self, mask: np.ndarray = None):
+        """
+        Returns agents to the start position.
+
+        :param mask: Boolean array selecting the environments to reset. Resets all of them if None.
+        """
+        if mask is None:
+            self.x = np.full(self.num_envs, self.start_x, dtype=int)
+            self.y = np.full(self.num_envs, self.start_y, dtype=int)
+        else:
+            self.x = np.where(mask, self.start_x, self.x)
+            self.y = np.where(mask, self.start_y, self.y)
+
+    def state_indices(self) -> np.ndarray:
+        """
+        :return: Row-major cell codes, consistent with GridWorldStateIndexer
+        """
+        return self.y * self.width + self.x
+
+    def sample_wind(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Draws the wind for agents standing in cells (x, y), with the same gust
+        distribution as GridWorld.apply_action.
+        """
+        strength = self.wind_field[y, x]
+        die_roll = self.rng.random(len(x)) * 3.0
+        gust = np.where(die_roll < self.stochasticity, strength - 1,
+                        np.where(die_roll > 3 - self.stochasticity, strength + 1, 0))
+        return np.where(strength > 0, gust, 0)
+
+    def step(self, actions: np.ndarray, mask: np.ndarray = None):
+        """
+        Applies one action in every environment.
+
+        :param actions: Direction values, one per environment
+        :param mask: Boolean array selecting the environments to step; the others stay where they are
+        :return: (x, y, rewards, dones) as arrays. Finished environments are not
+                 reset automatically; pass `dones` to reset() to start them over.
+        """
+        actions = np.asarray(actions)
+        x_prime, y_prime = self.domain.next_positions(self.x, self.y, actions, self.sample_wind(self.x, self.y))
+        if mask is not None:
+            x_prime = np.where(mask, x_prime, self.x)
+            y_prime = np.where(mask, y_prime, self.y)
+
+        rewards = self.task.rewards(self.x, self.y, x_prime, y_prime)
+        dones = self.terminals[y_prime, x_prime]
+
+        self.x = x_prime
+        self.y = y_prime
+        return x_prime, y_prime, rewards, dones
+
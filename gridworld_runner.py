@@ -1,30 +1,78 @@
-import copy
-import sys
-from typing import Tuple
+import argparse
+import functools
+import itertools
+import random
+from typing import List, Tuple
 
 import numpy as np
-import scipy as scipy
-import scipy.stats
 
+from agent.batched_tabular import BatchedTabularLearner
+from agent.episode_kernel import EpisodeKernel
 from agent.q_learning import QLearning
 from agent.sarsa_agent import SarsaAgent
 from agent.true_online_sarsa_lambda import TrueOnlineSarsaLambda
 from gridworld import ReachExit, GridWorld, Task, Domain, Direction
+from gridworld.policy_evaluation import expected_greedy_return, expected_greedy_returns
+from gridworld.transition_model import compile_model
+from rl.parallel import run_trials, seed_trial
+from rl.running_statistics import RunningStatistics
 
 evaluation_period = 50
 significance_level = 0.05
+replay_capacity = 10000
+planning_steps = 10
 
 stochasticity = 0.0
 
+compiled_models = {}
+
 
 def main():
-    experiment_num = int(sys.argv[1])
-    num_evaluations = int(sys.argv[2])
-    num_trials = int(sys.argv[3])
+    parser = argparse.ArgumentParser()
+    parser.add_argument("experiment_num", type=int)
+    parser.add_argument("num_evaluations", type=int)
+    parser.add_argument("num_trials", type=int)
+    parser.add_argument("stochasticity", type=float)
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to run trials in")
+    parser.add_argument("--seed", type=int, default=None, help="Base seed; trial i is seeded with seed + i")
+    parser.add_argument("--batched", action="store_true",
+                        help="Train every trial at once in one array. Not for replay or planning experiments")
+    parser.add_argument("--alphas", type=float, nargs="+", default=None,
+                        help="Sweep these step sizes, batched with the other swept hyperparameters")
+    parser.add_argument("--epsilons", type=float, nargs="+", default=None,
+                        help="Sweep these exploration rates")
+    parser.add_argument("--lambdas", type=float, nargs="+", default=None,
+                        help="Sweep these trace decay rates. True online experiments only")
+    arguments = parser.parse_args()
+    sweeping = arguments.alphas is not None or arguments.epsilons is not None or arguments.lambdas is not None
+
+    experiment_num = arguments.experiment_num
+    num_evaluations = arguments.num_evaluations
+    num_trials = arguments.num_trials
     global stochasticity
-    stochasticity = float(sys.argv[4])
+    stochasticity = arguments.stochasticity
+
+    def run(factory):
+        if sweeping:
+            return run_sweep(num_trials, num_evaluations, factory, arguments.alphas, arguments.epsilons,
+                             arguments.lambdas, seed=arguments.seed)
+        if arguments.batched:
+            return run_batched_experiment(num_trials, num_evaluations, factory, seed=arguments.seed)
+        return run_experiment(num_trials, num_evaluations, factory, workers=arguments.workers, seed=arguments.seed)
 
     def save(name, results):
+        if sweeping:
+            # One file per configuration; the swept λ replaces any fixed one in the name
+            name = name.split(" λ=")[0]
+            for ((alpha, epsilon, lmbda), configuration_results) in results:
+                label = " α=" + str(alpha) + " ε=" + str(epsilon)
+                if lmbda is not None:
+                    label += " λ=" + str(lmbda)
+                save_one(name + label, configuration_results)
+        else:
+            save_one(name, results)
+
+    def save_one(name, results):
         data = np.c_[results]
         np.savetxt("results/" + str(stochasticity) + "/n" + str(num_trials) + "_" + name + ".csv", data,
                    fmt=["%d", "%f", "%f", "%f"],
@@ -32,85 +80,143 @@ def main():
 
     if experiment_num == 0:
         factory = agent_factory(q_learning=True)
-        q_learning_results = run_experiment(num_trials, num_evaluations, factory)
+        q_learning_results = run(factory)
         save("Q-learning", q_learning_results)
     elif experiment_num == 1:
         factory = agent_factory()
-        standard_results = run_experiment(num_trials, num_evaluations, factory)
+        standard_results = run(factory)
         save("Sarsa", standard_results)
     elif experiment_num == 2:
         factory = agent_factory(expected=True)
-        expected_results = run_experiment(num_trials, num_evaluations, factory)
+        expected_results = run(factory)
         save("Expected Sarsa", expected_results)
+    elif experiment_num == 3:
+        factory = agent_factory(q_learning=True, replay_ratio=1.0)
+        replay_results = run(factory)
+        save("Q-learning replay", replay_results)
     elif experiment_num == 4:
         factory = agent_factory(true_online=True, lmbda=0.10)
-        true_online_results = run_experiment(num_trials, num_evaluations, factory)
+        true_online_results = run(factory)
         save("True Online Sarsa λ=0.1", true_online_results)
     elif experiment_num == 5:
         factory = agent_factory(true_online=True, lmbda=0.50)
-        true_online_sarsa_lambda = run_experiment(num_trials, num_evaluations, factory)
+        true_online_sarsa_lambda = run(factory)
         save("True Online Sarsa λ=0.5", true_online_sarsa_lambda)
     elif experiment_num == 6:
         factory = agent_factory(true_online=True, lmbda=0.80)
-        true_online_sarsa_lambda = run_experiment(num_trials, num_evaluations, factory)
+        true_online_sarsa_lambda = run(factory)
         save("True Online Sarsa λ=0.8", true_online_sarsa_lambda)
     elif experiment_num == 7:
         factory = agent_factory(true_online=True, lmbda=0.00)
-        true_online_sarsa_lambda = run_experiment(num_trials, num_evaluations, factory)
+        true_online_sarsa_lambda = run(factory)
         save("True Online Sarsa λ=0.0", true_online_sarsa_lambda)
-
+    elif experiment_num == 8:
+        factory = agent_factory(q_learning=True, planning_steps=planning_steps)
+        sweeping_results = run(factory)
+        save("Q-learning prioritized sweeping", sweeping_results)
 
 
 def run_experiment(num_trials, num_evaluations,
-                   agent_factory
+                   agent_factory,
+                   workers=1,
+                   seed=None
                    ):
     assert num_trials > 1
-    evaluations_mean = []
-    evaluations_variance = []
+    if seed is None:
+        seed = random.randrange(2 ** 31)
     series = [i * evaluation_period for i in range(0, num_evaluations)]
-    n = 0
-    for i in range(0, num_trials):
-        print("trial " + str(i))
-        j = int(0)
-        n += 1
-        for (num_episodes, table) in train_agent(evaluation_period,
-                                                 num_evaluations,
-                                                 agent_factory):
-            evaluation = evaluate(table, agent_factory)
-            # print(" R: " + str(evaluation))
-            mean = None
-            variance = None
-            if j > len(evaluations_mean) - 1:
-                evaluations_mean.append(0.0)
-                evaluations_variance.append(0.0)
-                mean = 0.0
-                variance = 0.0
-            else:
-                mean = evaluations_mean[j]
-                variance = evaluations_variance[j]
+    trial = functools.partial(run_trial, agent_factory, num_evaluations, seed, stochasticity)
+    statistics = run_trials(trial, num_trials, workers)
+
+    return series, statistics.means, statistics.variances(), statistics.confidences(significance_level)
+
+
+def run_batched_experiment(num_trials, num_evaluations, agent_factory, seed=None):
+    """
+    run_experiment for tabular agents, with every trial trained in lockstep by
+    one BatchedTabularLearner. Trials draw from one shared generator, so results
+    follow the same distribution as run_experiment but not the same sequence.
+    """
+    assert num_trials > 1
+    domain, task = configure_gridworld()
+    learner = agent_factory.batched_learner(domain, num_trials, np.random.default_rng(seed))
+    evaluations = train_batched(learner, domain, task, num_evaluations)
+    return summarize(evaluations)
 
-            delta = evaluation - mean
-            mean += delta / n
-            variance += delta * (evaluation - mean)
 
-            evaluations_mean[j] = mean
-            evaluations_variance[j] = variance
-            j += 1
+def run_sweep(num_trials, num_evaluations, agent_factory, alphas=None, epsilons=None, lambdas=None, seed=None):
+    """
+    Runs `num_trials` trials of every combination of the given hyperparameters
+    as one batch. Hyperparameters left as None keep the factory's value.
 
-    evaluations_variance = [variance / (n - 1) for variance in
-                            evaluations_variance]
+    :return: ((alpha, epsilon, lambda), results) for each configuration, with
+             results as returned by run_experiment. lambda is None for agents without traces.
+    """
+    assert num_trials > 1
+    configurations = list(itertools.product(alphas or [None], epsilons or [None], lambdas or [None]))
+    domain, task = configure_gridworld()
+    learner = agent_factory.batched_learner(domain, len(configurations) * num_trials, np.random.default_rng(seed),
+                                            alphas=[c[0] for c in configurations for i in range(0, num_trials)],
+                                            epsilons=[c[1] for c in configurations for i in range(0, num_trials)],
+                                            lambdas=[c[2] for c in configurations for i in range(0, num_trials)])
+    evaluations = train_batched(learner, domain, task, num_evaluations)
+
+    results = []
+    for c in range(0, len(configurations)):
+        first = c * num_trials
+        lmbda = float(learner.lamb[first]) if learner.eligibility is not None else None
+        results.append(((float(learner.alpha[first]), float(learner.epsilon[first]), lmbda),
+                        summarize(evaluations[first:first + num_trials])))
+    return results
+
+
+def train_batched(learner: BatchedTabularLearner, domain, task, num_evaluations) -> np.ndarray:
+    """
+    :return: A (num_trials, num_evaluations) array of evaluations, taken every
+             evaluation_period episodes starting before the first
+    """
+    model = compiled_model(domain, task)
+    evaluations = np.zeros((learner.num_trials, num_evaluations))
+    for j in range(0, num_evaluations):
+        learner.train(j * evaluation_period)
+        evaluations[:, j] = expected_greedy_returns(learner.snapshot(), domain, model, horizon=200,
+                                                    tolerance=learner.tolerance)
+    return evaluations
+
+
+def summarize(evaluations: np.ndarray):
+    """
+    :param evaluations: A (num_trials, num_evaluations) array
+    :return: Results in the form run_experiment returns them
+    """
+    series = [i * evaluation_period for i in range(0, evaluations.shape[1])]
+    statistics = RunningStatistics()
+    for trial_evaluations in evaluations:
+        statistics.update(trial_evaluations.tolist())
+    return series, statistics.means, statistics.variances(), statistics.confidences(significance_level)
 
-    confidences = []
-    for (mean, variance) in zip(evaluations_mean, evaluations_variance):
-        crit = scipy.stats.t.ppf(1.0 - significance_level, n - 1)
-        width = crit * np.math.sqrt(variance) / np.math.sqrt(n)
-        confidences.append(width)
 
-    return series, evaluations_mean, evaluations_variance, confidences
+def run_trial(agent_factory, num_evaluations, seed, stochasticity_level, i) -> List[float]:
+    """
+    Trains and evaluates one agent. Everything the trial depends on is passed in
+    so that it can run in a worker process.
+    """
+    global stochasticity
+    stochasticity = stochasticity_level
+    seed_trial(seed + i)
+    print("trial " + str(i))
+    evaluations = []
+    for (num_episodes, table) in train_agent(evaluation_period,
+                                             num_evaluations,
+                                             agent_factory):
+        evaluation = evaluate(table, agent_factory)
+        # print(" R: " + str(evaluation))
+        evaluations.append(evaluation)
+    return evaluations
 
 
 def plot_trajectory(trajectory):
-    result_grid = trajectory[0][0].map
+    result_grid = trajectory[0][0].map.tolist()
     for state, action in trajectory:
         if action.direction == Direction.up:
             act_string = "↑"
@@ -133,6 +239,26 @@ def plot_trajectory(trajectory):
 
 
 def evaluate(table, agent_factory) -> float:
+    """
+    The exact expected return of the greedy policy for `table`, capped at the
+    same number of steps as a rollout.
+    """
+    domain, task = configure_gridworld()
+    agent = agent_factory(domain, task)
+    model = compiled_model(domain, task)
+    return expected_greedy_return(table, domain, model, feature_extractor=getattr(agent, "feature_extractor", None),
+                                  horizon=200)
+
+
+def compiled_model(domain, task):
+    model = compiled_models.get(stochasticity)
+    if model is None:
+        model = compile_model(domain, task)
+        compiled_models[stochasticity] = model
+    return model
+
+
+def evaluate_rollout(table, agent_factory) -> float:
     domain, task = configure_gridworld()
     agent = agent_factory(domain, task)
     agent.value_function = table
@@ -173,16 +299,23 @@ def train_agent(evaluation_period, num_stops, agent_factory):
     """
     domain, task = configure_gridworld()
     agent = agent_factory(domain, task)
+    # Plain tabular agents train through the compiled kernel, which learns the same table
+    kernel = EpisodeKernel(agent) if EpisodeKernel.supports(agent) else None
 
     stops = 0
     for i in range(0, evaluation_period * num_stops):
         if i % evaluation_period is 0:
             #print(i)
             stops += 1
-            yield i, copy.deepcopy(agent.value_function)
+            yield i, agent.value_function.snapshot()
 
         if num_stops == stops:
             return
+        if kernel is not None:
+            kernel.run_episode()
+            agent.episode_ended()
+            domain.reset()
+            continue
         terminated = False
         max_steps = 200
         current_step = 0
@@ -209,17 +342,81 @@ def agent_factory(initial_value=0.5,
                   epsilon=0.1,
                   alpha=0.2,
                   lmbda=0.95,
-                  expected=False, true_online=False, q_learning=False):
-    def generate_agent(domain, task):
-        if true_online:
-            agent = TrueOnlineSarsaLambda(domain, task, epsilon=epsilon, alpha=alpha, lamb=lmbda, expected=False)
-        elif q_learning:
-            agent = QLearning(domain, task)
+                  expected=False, true_online=False, q_learning=False,
+                  dense_table=True, replay_ratio=0.0, planning_steps=0):
+    return AgentFactory(initial_value, epsilon, alpha, lmbda, expected, true_online, q_learning, dense_table,
+                        replay_ratio, planning_steps)
+
+
+class AgentFactory:
+    """
+    Builds a configured agent for a domain and task. A class rather than a
+    closure so that it can be sent to worker processes.
+    """
+
+    def __init__(self, initial_value, epsilon, alpha, lmbda, expected, true_online, q_learning, dense_table,
+                 replay_ratio, planning_steps):
+        self.initial_value = initial_value
+        self.epsilon = epsilon
+        self.alpha = alpha
+        self.lmbda = lmbda
+        self.expected = expected
+        self.true_online = true_online
+        self.q_learning = q_learning
+        self.dense_table = dense_table
+        self.replay_ratio = replay_ratio
+        self.planning_steps = planning_steps
+
+    def __call__(self, domain, task):
+        if self.true_online:
+            agent = TrueOnlineSarsaLambda(domain, task, epsilon=self.epsilon, alpha=self.alpha, lamb=self.lmbda,
+                                          expected=False)
+        elif self.q_learning:
+            if self.replay_ratio > 0.0:
+                agent = QLearning(domain, task, dense_table=True, replay_capacity=replay_capacity,
+                                  replay_ratio=self.replay_ratio)
+            elif self.planning_steps > 0:
+                agent = QLearning(domain, task, dense_table=True, planning_steps=self.planning_steps)
+            else:
+                agent = QLearning(domain, task, dense_table=self.dense_table)
         else:
-            agent = SarsaAgent(domain, task, epsilon=epsilon, alpha=alpha, expected=expected)
+            agent = SarsaAgent(domain, task, epsilon=self.epsilon, alpha=self.alpha, expected=self.expected,
+                               dense_table=self.dense_table)
         return agent
 
-    return generate_agent
+    def batched_learner(self, domain, num_trials, rng, alphas=None, epsilons=None,
+                        lambdas=None) -> BatchedTabularLearner:
+        """
+        A learner that trains `num_trials` independent copies of the agent
+        __call__ builds.
+
+        :param alphas: Per-trial step sizes; None entries, or None, keep the agent's own
+        :param epsilons: Per-trial exploration rates, likewise
+        :param lambdas: Per-trial trace decay rates, likewise. Only for true online agents
+        """
+        assert self.replay_ratio == 0.0 and self.planning_steps == 0, "Only plain tabular agents can be batched"
+        if self.q_learning:
+            # QLearning is built with its own defaults
+            method, alpha, epsilon = "q_learning", 0.6, 0.1
+        else:
+            alpha, epsilon = self.alpha, self.epsilon
+            if self.true_online:
+                method = "true_online_sarsa_lambda"
+            else:
+                method = "expected_sarsa" if self.expected else "sarsa"
+        if not self.true_online:
+            assert lambdas is None or all(l is None for l in lambdas), "Only true online agents have traces"
+
+        def per_trial(values, default):
+            if values is None:
+                return default
+            return [default if value is None else value for value in values]
+
+        # LinearVFA only treats exact equality as a tie
+        tolerance = 0.0 if self.true_online else 0.000001
+        return BatchedTabularLearner(domain, num_trials, method=method, epsilon=per_trial(epsilons, epsilon),
+                                     alpha=per_trial(alphas, alpha), lamb=per_trial(lambdas, self.lmbda),
+                                     tolerance=tolerance, rng=rng)
 
 
 if __name__ == '__main__':
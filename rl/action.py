@@ -1,2 +1,2 @@
 class Action():
-    ()
+    __slots__ = ()
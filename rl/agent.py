@@ -1,5 +1,6 @@
 from rl.action import Action
 from rl.domain import Domain
+from rl.random_streams import RandomStream, default_stream
 from rl.task import Task
 
 
@@ -9,9 +10,13 @@ class Agent(object):
     world. Its knowledge comes from the states returned by the world.
     """
 
-    def __init__(self, domain: Domain, task: Task):
+    def __init__(self, domain: Domain, task: Task, rng: RandomStream = None):
+        """
+        :param rng: The stream the agent draws from. Defaults to the shared default stream.
+        """
         self.domain = domain
         self.task = task
+        self.rng = rng if rng is not None else default_stream()
 
     def act(self):
         """
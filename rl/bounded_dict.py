@@ -0,0 +1,106 @@
+import sys
+from collections import OrderedDict
+
+# Rough bytes an OrderedDict spends per entry on top of its key and value
+entry_overhead = 100
+
+
+class BoundedDict:
+    """
+    A dict that holds at most `capacity` entries, or roughly `max_bytes` of
+    keys and values, evicting the least recently used entry to make room.
+    Reads through get() count as uses and are tallied as hits or misses.
+
+    It offers the subset of dict that the value tables use, plus snapshot(),
+    so it can stand in for a CopyOnWriteDict table.
+    """
+
+    def __init__(self, capacity: int = None, max_bytes: int = None):
+        """
+        :param capacity: Most entries to keep
+        :param max_bytes: Approximate memory ceiling, counting keys, values and per-entry overhead
+        """
+        if capacity is None and max_bytes is None:
+            raise ValueError("A BoundedDict needs a capacity or a max_bytes limit")
+        if capacity is not None and capacity < 1:
+            raise ValueError("capacity must be at least 1, got " + str(capacity))
+        if max_bytes is not None and max_bytes < entry_overhead:
+            raise ValueError("max_bytes must be at least the per-entry overhead of " + str(entry_overhead) +
+                             " bytes, got " + str(max_bytes))
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def entry_bytes(key, value) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(value) + entry_overhead
+
+    def _over(self) -> bool:
+        if self.capacity is not None and len(self._data) > self.capacity:
+            return True
+        return self.max_bytes is not None and self.bytes > self.max_bytes
+
+    def snapshot(self) -> "BoundedDict":
+        """
+        :return: A copy with the same limits and counters
+        """
+        snapshot = BoundedDict(self.capacity, self.max_bytes)
+        snapshot._data = self._data.copy()
+        snapshot.bytes = self.bytes
+        snapshot.hits = self.hits
+        snapshot.misses = self.misses
+        snapshot.evictions = self.evictions
+        return snapshot
+
+    def get(self, key, default=None):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        existing_value = self._data.get(key)
+        if existing_value is not None:
+            self.bytes -= self.entry_bytes(key, existing_value)
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self.bytes += self.entry_bytes(key, value)
+        # The newest entry always stays, even if it alone is over max_bytes
+        while self._over() and len(self._data) > 1:
+            (evicted_key, evicted_value) = self._data.popitem(last=False)
+            self.bytes -= self.entry_bytes(evicted_key, evicted_value)
+            self.evictions += 1
+
+    def __delitem__(self, key):
+        value = self._data.pop(key)
+        self.bytes -= self.entry_bytes(key, value)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def items(self):
+        return self._data.items()
+
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
@@ -0,0 +1,75 @@
+from typing import Any, Callable
+
+
+class CopyOnWriteDict:
+    """
+    A dict whose snapshots are taken in O(1). A snapshot shares the underlying
+    storage; whichever side writes to it first takes a private shallow copy, so
+    a snapshot never observes later writes and the table is only ever copied
+    once per snapshot, with C-level dict copies rather than deepcopy.
+
+    Values that are mutated in place must be reached through mutable(), and
+    `copy_value` must copy them.
+    """
+
+    def __init__(self, copy_value: Callable[[Any], Any] = None):
+        self._data = dict()
+        self._shared = False
+        self.copy_value = copy_value
+
+    def snapshot(self) -> "CopyOnWriteDict":
+        snapshot = CopyOnWriteDict(self.copy_value)
+        snapshot._data = self._data
+        snapshot._shared = True
+        self._shared = True
+        return snapshot
+
+    def _own(self):
+        if self.copy_value is None:
+            self._data = self._data.copy()
+        else:
+            copy_value = self.copy_value
+            self._data = {key: copy_value(value) for (key, value) in self._data.items()}
+        self._shared = False
+
+    def mutable(self, key):
+        """
+        :return: The value at `key`, safe to modify in place
+        """
+        if self._shared:
+            self._own()
+        return self._data[key]
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        if self._shared:
+            self._own()
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        if self._shared:
+            self._own()
+        del self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def items(self):
+        return self._data.items()
+
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
@@ -0,0 +1,147 @@
+from typing import Tuple
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+from rl.tabular_model import TabularModel
+
+dense_state_limit = 2048
+
+
+def value_iteration(model: TabularModel, gamma=0.95, tolerance=1e-8, max_iterations=10000) -> np.ndarray:
+    """
+    Synchronous value iteration.
+
+    :return: Q*, as a (num_states, num_actions) array
+    """
+    values = np.zeros(model.num_states)
+    action_values = model.backup(values, gamma)
+    for i in range(0, max_iterations):
+        new_values = action_values.max(axis=1)
+        converged = np.max(np.abs(new_values - values)) < tolerance
+        values = new_values
+        action_values = model.backup(values, gamma)
+        if converged:
+            break
+    return action_values
+
+
+def policy_iteration(model: TabularModel, gamma=0.95, max_iterations=1000) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Howard's policy iteration with exact policy evaluation. Requires gamma < 1
+    unless every policy reaches a terminal state.
+
+    :return: Q* and a deterministic optimal policy as a (num_states, num_actions) array
+    """
+    policy = np.zeros((model.num_states, model.num_actions))
+    policy[:, 0] = 1.0
+    for i in range(0, max_iterations):
+        values = evaluate_policy(model, policy, gamma)
+        action_values = model.backup(values, gamma)
+        # Keep the current action unless another is strictly better, so ties can't cycle
+        current = action_values[policy > 0.0].reshape(model.num_states)
+        improved = action_values.argmax(axis=1)
+        stable = action_values[np.arange(model.num_states), improved] <= current + 1e-10
+        choices = np.where(stable, policy.argmax(axis=1), improved)
+        new_policy = np.zeros_like(policy)
+        new_policy[np.arange(model.num_states), choices] = 1.0
+        if np.array_equal(new_policy, policy):
+            return action_values, policy
+        policy = new_policy
+    return model.backup(evaluate_policy(model, policy, gamma), gamma), policy
+
+
+def evaluate_policy(model: TabularModel, policy: np.ndarray, gamma=0.95, horizon: int = None) -> np.ndarray:
+    """
+    Computes the state values of a policy exactly.
+
+    Without a horizon this solves (I - gamma P) v = r. When gamma is 1, states
+    from which the policy may never terminate have no finite value and are
+    reported as nan. With a horizon, the values are the expected return of the
+    first `horizon` steps.
+
+    :param policy: A (num_states, num_actions) array of action probabilities
+    """
+    transitions, rewards = model.policy_transitions(policy)
+
+    if horizon is not None:
+        if model.num_states <= dense_state_limit:
+            # Small chains are far cheaper to iterate as dense arrays than through scipy's dispatch
+            transitions = transitions.toarray()
+        values = np.zeros(model.num_states)
+        for i in range(0, horizon):
+            new_values = rewards + gamma * transitions.dot(values)
+            new_values[model.terminal] = 0.0
+            if np.array_equal(new_values, values):
+                break
+            values = new_values
+        return values
+
+    solvable = ~model.terminal
+    if gamma >= 1.0:
+        solvable &= terminates(transitions, model.terminal)
+    values = np.full(model.num_states, np.nan)
+    values[model.terminal] = 0.0
+    indices = np.flatnonzero(solvable)
+    # Solvable states only lead to other solvable or terminal states, which are 0
+    block = transitions[indices][:, indices]
+    system = scipy.sparse.identity(len(indices), format="csc") - gamma * block.tocsc()
+    values[indices] = scipy.sparse.linalg.spsolve(system, rewards[indices])
+    return values
+
+
+def evaluate_policies(model: TabularModel, policies: np.ndarray, gamma=0.95, horizon=200) -> np.ndarray:
+    """
+    evaluate_policy with a horizon, for a batch of policies iterated together.
+
+    :param policies: A (num_policies, num_states, num_actions) array of action probabilities
+    :return: A (num_policies, num_states) array of values
+    """
+    # States lead the batch axis so that the sparse transition matrices apply to every policy at once
+    weights = np.moveaxis(policies, 0, 1)
+    rewards = np.einsum("spa,sa->sp", weights, model.rewards)
+    values = np.zeros((model.num_states, len(policies)))
+    for i in range(0, horizon):
+        new_values = rewards.copy()
+        for a in range(0, model.num_actions):
+            new_values += gamma * weights[:, :, a] * model.transitions[a].dot(values)
+        new_values[model.terminal] = 0.0
+        if np.array_equal(new_values, values):
+            break
+        values = new_values
+    return values.T
+
+
+def terminates(transitions: scipy.sparse.csr_matrix, terminal: np.ndarray) -> np.ndarray:
+    """
+    :param transitions: The transition matrix of a Markov chain
+    :return: A mask of the states from which the chain reaches `terminal` with probability 1
+    """
+    # Grow the set of states that can reach a terminal state at all
+    can_terminate = terminal.copy()
+    while True:
+        grown = can_terminate | (transitions.dot(can_terminate.astype(float)) > 0.0)
+        if np.array_equal(grown, can_terminate):
+            break
+        can_terminate = grown
+
+    # Anything that can wander into a state that never terminates may not terminate either
+    doomed = ~can_terminate
+    while True:
+        grown = doomed | ((transitions.dot(doomed.astype(float)) > 0.0) & ~terminal)
+        if np.array_equal(grown, doomed):
+            break
+        doomed = grown
+    return ~doomed
+
+
+def greedy_policy(action_values: np.ndarray, tolerance=0.000001) -> np.ndarray:
+    """
+    The greedy policy for `action_values`, splitting probability evenly between
+    actions within `tolerance` of the best.
+
+    :param action_values: A (num_states, num_actions) array, or a batch of them
+    """
+    best = action_values >= action_values.max(axis=-1, keepdims=True) - tolerance
+    return best / best.sum(axis=-1, keepdims=True)
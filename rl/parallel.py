@@ -0,0 +1,37 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List
+
+import numpy as np
+
+from rl import random_streams
+from rl.running_statistics import RunningStatistics
+
+
+def seed_trial(seed: int):
+    """
+    Seeds every random source the agents and domains draw from.
+    """
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    random_streams.seed(seed)
+
+
+def run_trials(trial: Callable[[int], List[float]], num_trials: int, workers=1) -> RunningStatistics:
+    """
+    Runs `trial(i)` for every trial index and accumulates the evaluations it returns.
+
+    Trials run in a process pool when `workers` > 1, so `trial` must be picklable
+    and seed itself from its index. Results are merged in trial order, which makes
+    the statistics identical to a serial run.
+    """
+    statistics = RunningStatistics()
+    if workers <= 1:
+        for i in range(0, num_trials):
+            statistics.merge(RunningStatistics.of_trial(trial(i)))
+        return statistics
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for evaluations in executor.map(trial, range(0, num_trials)):
+            statistics.merge(RunningStatistics.of_trial(evaluations))
+    return statistics
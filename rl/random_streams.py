@@ -0,0 +1,105 @@
+import random
+from typing import Sequence
+
+import numpy as np
+
+
+class RandomStream:
+    """
+    Uniform random numbers drawn from a NumPy Generator a block at a time and
+    handed out one by one, so per-step draws cost a list lookup instead of a
+    generator call. Agents and domains that share a stream consume it in a
+    fixed order, which makes a trial reproducible from the stream's seed.
+
+    Hot loops can consume `block` directly from `position` after reserve(),
+    and must store `position` back when done.
+    """
+
+    def __init__(self, generator: np.random.Generator = None, block_size=4096):
+        """
+        :param generator: Defaults to a generator seeded from the `random` module
+        """
+        self.generator = generator if generator is not None else spawn_generator()
+        self.block_size = block_size
+        self.block = []
+        self.position = 0
+
+    def seed(self, seed: int):
+        """
+        Restarts the stream from `seed`, discarding any numbers already drawn.
+        """
+        self.generator = np.random.default_rng(seed)
+        self.block = []
+        self.position = 0
+
+    def refill(self) -> list:
+        """
+        Draws the next block and rewinds to its start.
+
+        :return: The new block
+        """
+        self.block = self.generator.random(self.block_size).tolist()
+        self.position = 0
+        return self.block
+
+    def reserve(self, n: int) -> list:
+        """
+        Makes sure at least `n` numbers are left in the block, without changing
+        the sequence the stream hands out. Rewinds `position` to 0.
+
+        :return: The block
+        """
+        if len(self.block) - self.position < n:
+            self.block = self.block[self.position:] + self.generator.random(max(n, self.block_size)).tolist()
+        else:
+            self.block = self.block[self.position:]
+        self.position = 0
+        return self.block
+
+    def random(self) -> float:
+        """
+        :return: A float uniform over [0, 1)
+        """
+        if self.position == len(self.block):
+            self.refill()
+        value = self.block[self.position]
+        self.position += 1
+        return value
+
+    def randbelow(self, n: int) -> int:
+        """
+        :return: An int uniform over [0, n), from a single draw
+        """
+        return int(self.random() * n)
+
+    def choice(self, options: Sequence):
+        return options[int(self.random() * len(options))]
+
+
+def spawn_generator() -> np.random.Generator:
+    """
+    A NumPy Generator seeded from the `random` module, so that seeding `random`
+    (see rl.parallel.seed_trial) also fixes generators created afterwards.
+    """
+    return np.random.default_rng(random.getrandbits(64))
+
+
+_default_stream = None
+
+
+def default_stream() -> RandomStream:
+    """
+    The stream agents and domains share unless they are given their own.
+    """
+    global _default_stream
+    if _default_stream is None:
+        _default_stream = RandomStream()
+    return _default_stream
+
+
+def seed(seed: int):
+    """
+    Reseeds the default stream in place, so objects that already hold it
+    follow the new seed.
+    """
+    default_stream().seed(seed)
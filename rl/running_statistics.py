@@ -0,0 +1,85 @@
+import math
+from typing import List
+
+import scipy.stats
+
+
+class RunningStatistics:
+    """
+    Per-evaluation means and sums of squared deviations over a number of trials,
+    accumulated with Welford's method. Statistics gathered separately can be
+    combined with merge().
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.means = []
+        self.squared_deviations = []
+
+    @staticmethod
+    def of_trial(evaluations: List[float]) -> "RunningStatistics":
+        statistics = RunningStatistics()
+        statistics.update(evaluations)
+        return statistics
+
+    def update(self, evaluations: List[float]):
+        """
+        Adds one trial.
+
+        :param evaluations: The trial's evaluation at each stop
+        """
+        self.count += 1
+        n = self.count
+        for (j, evaluation) in enumerate(evaluations):
+            if j > len(self.means) - 1:
+                self.means.append(0.0)
+                self.squared_deviations.append(0.0)
+            mean = self.means[j]
+            delta = evaluation - mean
+            mean += delta / n
+            self.squared_deviations[j] += delta * (evaluation - mean)
+            self.means[j] = mean
+
+    def merge(self, other: "RunningStatistics"):
+        """
+        Folds in statistics over a disjoint set of trials (Chan et al.'s parallel
+        update). Merging a single trial is exactly update(), so folding trials in
+        one at a time gives the same bits as a serial run.
+        """
+        if other.count == 0:
+            return
+        if other.count == 1:
+            self.update(other.means)
+            return
+        if self.count == 0:
+            self.count = other.count
+            self.means = list(other.means)
+            self.squared_deviations = list(other.squared_deviations)
+            return
+
+        n_a = self.count
+        n_b = other.count
+        n = n_a + n_b
+        for j in range(0, len(other.means)):
+            if j > len(self.means) - 1:
+                self.means.append(0.0)
+                self.squared_deviations.append(0.0)
+            delta = other.means[j] - self.means[j]
+            self.means[j] += delta * n_b / n
+            self.squared_deviations[j] += other.squared_deviations[j] + delta * delta * n_a * n_b / n
+        self.count = n
+
+    def variances(self) -> List[float]:
+        return [squared_deviation / (self.count - 1) for squared_deviation in self.squared_deviations]
+
+    def confidences(self, significance_level: float) -> List[float]:
+        """
+        :return: The half-width of the one-sided t confidence interval for each mean
+        """
+        n = self.count
+        confidences = []
+        for variance in self.variances():
+            crit = scipy.stats.t.ppf(1.0 - significance_level, n - 1)
+            width = crit * math.sqrt(variance) / math.sqrt(n)
+            confidences.append(width)
+        return confidences
@@ -1,2 +1,2 @@
 class State():
-    ()
+    __slots__ = ()
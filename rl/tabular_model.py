@@ -0,0 +1,62 @@
+from typing import List
+
+import numpy as np
+import scipy.sparse
+
+
+class TabularModel:
+    """
+    A finite MDP in array form. For every action there is a sparse
+    (num_states, num_states) transition matrix and a matching matrix holding the
+    reward of each transition. Terminal states have value 0 by definition.
+    """
+
+    def __init__(self, transitions: List[scipy.sparse.csr_matrix], transition_rewards: List[scipy.sparse.csr_matrix],
+                 terminal: np.ndarray):
+        assert len(transitions) == len(transition_rewards)
+        self.transitions = transitions
+        self.transition_rewards = transition_rewards
+        self.terminal = terminal
+        self.num_states = terminal.shape[0]
+        self.num_actions = len(transitions)
+
+        # Expected immediate reward for each state-action pair
+        self.rewards = np.zeros((self.num_states, self.num_actions))
+        for a in range(0, self.num_actions):
+            expected = transitions[a].multiply(transition_rewards[a]).sum(axis=1)
+            self.rewards[:, a] = np.asarray(expected).ravel()
+        self.rewards[terminal] = 0.0
+
+        # Every action's transitions as one coordinate list, for collapsing under a policy
+        stacked = [transitions[a].tocoo() for a in range(0, self.num_actions)]
+        self._rows = np.concatenate([m.row for m in stacked])
+        self._cols = np.concatenate([m.col for m in stacked])
+        self._probabilities = np.concatenate([m.data for m in stacked])
+        self._actions = np.concatenate([np.full(m.nnz, a) for (a, m) in enumerate(stacked)])
+
+    def backup(self, values: np.ndarray, gamma: float) -> np.ndarray:
+        """
+        One synchronous Bellman backup of the state values.
+
+        :return: A (num_states, num_actions) array of action values
+        """
+        action_values = np.empty((self.num_states, self.num_actions))
+        for a in range(0, self.num_actions):
+            action_values[:, a] = self.transitions[a].dot(values)
+        action_values *= gamma
+        action_values += self.rewards
+        action_values[self.terminal] = 0.0
+        return action_values
+
+    def policy_transitions(self, policy: np.ndarray):
+        """
+        Collapses the model under a stochastic policy.
+
+        :param policy: A (num_states, num_actions) array of action probabilities
+        :return: The (num_states, num_states) transition matrix and the expected
+                 reward vector of the resulting Markov reward process
+        """
+        data = self._probabilities * policy[self._rows, self._actions]
+        matrix = scipy.sparse.coo_matrix((data, (self._rows, self._cols)), shape=(self.num_states, self.num_states))
+        rewards = (policy * self.rewards).sum(axis=1)
+        return matrix.tocsr(), rewards
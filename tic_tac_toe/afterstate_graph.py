@@ -0,0 +1,102 @@
+import functools
+from typing import Dict, List
+
+import numpy as np
+
+from tic_tac_toe import TicTacToeState
+from tic_tac_toe.bitboard import BitboardState, BitboardWinTicTacToeTask, BitboardTicTacToeDomain, popcount, \
+    crosses_symbol, noughts_symbol
+from tic_tac_toe.board_code import symbol_digits
+
+
+class AfterstateGraph:
+    """
+    Every position reachable in a game on a size x size board, whichever
+    player starts, numbered once up front. Each player's moves are stored as
+    CSR arrays: the afterstates `symbol` can move to from state s are
+    targets[symbol][offsets[symbol][s]:offsets[symbol][s + 1]], and moves[symbol]
+    holds the matching row-major cell indices, in row-major order.
+    """
+
+    def __init__(self, size=3):
+        self.size = size
+        domain = BitboardTicTacToeDomain(size)
+        task = BitboardWinTicTacToeTask(domain)
+
+        self.states = []  # type: List[BitboardState]
+        self.index = {}  # type: Dict[int, int]
+        successors = {crosses_symbol: [], noughts_symbol: []}
+        frontier = [BitboardState(size)]
+        self._add(frontier[0])
+        # Breadth-first, so ids grow with the number of pieces on the board
+        while len(frontier) > 0:
+            next_frontier = []
+            for state in frontier:
+                lists = {crosses_symbol: [], noughts_symbol: []}
+                if not task.stateisfinal(state):
+                    for symbol in self.movers(state):
+                        for (x, y) in state.empty_cells():
+                            afterstate = state.with_move(symbol, x, y)
+                            if afterstate.code() not in self.index:
+                                self._add(afterstate)
+                                next_frontier.append(afterstate)
+                            lists[symbol].append((self.index[afterstate.code()], y * size + x))
+                for symbol in successors:
+                    successors[symbol].append(lists[symbol])
+            frontier = next_frontier
+
+        self.num_states = len(self.states)
+        self.codes = np.array([state.code() for state in self.states], dtype=np.int64)
+        self.winners = np.array([symbol_digits[task.winner(state)] for state in self.states], dtype=np.int8)
+        self.draws = np.array([task.draw(state) and task.winner(state) is None for state in self.states])
+        self.terminal = (self.winners > 0) | self.draws
+
+        self.offsets = {}
+        self.targets = {}
+        self.moves = {}
+        for (symbol, per_state) in successors.items():
+            counts = [len(edges) for edges in per_state]
+            self.offsets[symbol] = np.concatenate([[0], np.cumsum(counts)]).astype(int)
+            edges = [edge for edges in per_state for edge in edges]
+            self.targets[symbol] = np.array([target for (target, _) in edges], dtype=int)
+            self.moves[symbol] = np.array([move for (_, move) in edges], dtype=int)
+
+    def _add(self, state: BitboardState):
+        self.index[state.code()] = len(self.states)
+        self.states.append(state)
+
+    @staticmethod
+    def movers(state: BitboardState) -> List[str]:
+        """
+        :return: The symbols that can move next, judging by the piece counts alone
+        """
+        crosses = popcount(state.crosses)
+        noughts = popcount(state.noughts)
+        movers = []
+        if crosses <= noughts:
+            movers.append(crosses_symbol)
+        if noughts <= crosses:
+            movers.append(noughts_symbol)
+        return movers
+
+    def state_id(self, state: TicTacToeState) -> int:
+        return self.index[state.code()]
+
+    def initial_values(self, symbol: str, initial_value: float) -> np.ndarray:
+        """
+        Values as LearningAgent initializes them for `symbol`: 1 for wins and
+        draws, 0 for losses and `initial_value` elsewhere.
+        """
+        values = np.full(self.num_states, initial_value)
+        values[self.draws] = 1.0
+        values[self.winners == symbol_digits[symbol]] = 1.0
+        values[(self.winners > 0) & (self.winners != symbol_digits[symbol])] = 0.0
+        return values
+
+
+@functools.lru_cache(maxsize=None)
+def afterstate_graph(size=3) -> AfterstateGraph:
+    """
+    The graph for `size`, built once per process.
+    """
+    return AfterstateGraph(size)
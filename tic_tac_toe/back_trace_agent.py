@@ -1,14 +1,17 @@
-import random
-from copy import deepcopy
-
-from tic_tac_toe import TicTacToeAgent, TicTacToeState, TicTacToeAction, State, Action
+from rl.copy_on_write import CopyOnWriteDict
+from tic_tac_toe import TicTacToeAgent, TicTacToeAction, State, Action
 
 
 class BacktraceAgent(TicTacToeAgent):
     def __init__(self, symbol: str, world, task, alpha=0.2, epsilon=0.1,
-                 initial_value=0.5, lamb=0.0, update_exploratory=False):
+                 initial_value=0.5, lamb=0.0, update_exploratory=False, symmetric=False, table=None):
+        """
+        :param symmetric: Share one table entry between boards that are rotations or reflections of each other
+        :param table: Where to keep values, such as a BoundedDict. Defaults to an unbounded CopyOnWriteDict
+        """
         super().__init__(symbol, world, task)
-        self.table = {}
+        self.symmetric = symmetric
+        self.table = table if table is not None else CopyOnWriteDict()
         self.update_exploratory = update_exploratory
         self.alpha = alpha
         self.epsilon = epsilon
@@ -19,8 +22,17 @@ class BacktraceAgent(TicTacToeAgent):
         self.was_exploratory = False
         self.traces = {}
 
+    def table_key(self, state: State) -> int:
+        """
+        :return: The key of `state` in the table: its board code, shared with its symmetric variants if `symmetric`
+        """
+        if self.symmetric:
+            return state.canonical_code()
+        return state.code()
+
     def value_of_state(self, state: State) -> float:
-        existing_value = self.table.get(state)
+        key = self.table_key(state)
+        existing_value = self.table.get(key)
 
         if existing_value is None:
             new_value = self.initial_value
@@ -32,29 +44,24 @@ class BacktraceAgent(TicTacToeAgent):
             elif self.task.draw(state):
                 new_value = 1.0
 
-            self.table[state] = new_value
+            self.table[key] = new_value
+            return new_value
 
-        return self.table.get(state)
+        return existing_value
 
     def value_of_action_in_state(self, state, x, y) -> float:
         return self.value_of_state(self.state_for_action(state, x, y))
 
     def state_for_action(self, state, x, y) -> State:
-        representation_copy = deepcopy(state.representation)
-        representation_copy[y][x] = self.symbol
-        return TicTacToeState(representation_copy)
+        return state.with_move(self.symbol, x, y)
 
     def choose_action(self, state) -> Action:
-        options = []
-        for y in range(0, len(state.representation)):
-            for x in range(0, len(state.representation[0])):
-                if state.representation[y][x] is None:
-                    options.append((x, y))
+        options = state.empty_cells()
 
-        if random.random() < self.epsilon:
+        if self.rng.random() < self.epsilon:
             self.was_exploratory = True
 
-            choice = random.choice(options)
+            choice = self.rng.choice(options)
             self.previous_state = state
             self.previous_move = self.state_for_action(state, choice[0],
                                                        choice[1])
@@ -94,10 +101,12 @@ class BacktraceAgent(TicTacToeAgent):
 
         error = prime_value - prev_value
 
+        # Kept in a local, since a bounded table may have evicted the entry while valuing state_prime
+        state_key = self.table_key(state)
         for (key, trace_value) in self.traces.items():
-            old_value = self.table[state]
             update = trace_value * self.alpha * error
-            self.table[state] = old_value + update
+            prev_value = prev_value + update
+            self.table[state_key] = prev_value
 
     def prepare_for_new_episode(self, state):
         self.previous_state = state
@@ -0,0 +1,174 @@
+import functools
+from typing import List, Tuple
+
+from rl.action import Action
+from rl.domain import Domain
+from rl.task import Task
+from tic_tac_toe import TicTacToeState, TicTacToeAction
+from tic_tac_toe.board_code import symbol_digits, canonical_digits_code
+
+# Which bitboard each symbol's moves go in
+crosses_symbol = "X"
+noughts_symbol = "O"
+
+
+@functools.lru_cache(maxsize=None)
+def line_masks(size: int) -> Tuple[int, ...]:
+    """
+    Masks of the rows, columns and both diagonals of a board, where cell
+    (x, y) is bit y * size + x. They're in the order WinTicTacToeTask scans.
+    """
+    masks = []
+    for y in range(0, size):
+        masks.append(sum(1 << (y * size + x) for x in range(0, size)))
+    for x in range(0, size):
+        masks.append(sum(1 << (y * size + x) for y in range(0, size)))
+    masks.append(sum(1 << (i * size + i) for i in range(0, size)))
+    masks.append(sum(1 << ((size - 1 - i) * size + i) for i in range(0, size)))
+    return tuple(masks)
+
+
+@functools.lru_cache(maxsize=None)
+def _cells(size: int) -> Tuple[Tuple[int, int], ...]:
+    return tuple((i % size, i // size) for i in range(0, size * size))
+
+
+def popcount(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+class BitboardState(TicTacToeState):
+    """
+    A board as one bitmask per player. It's immutable, so it is shared rather
+    than copied, and moves are bit-ors. It hashes and compares like the
+    TicTacToeState with the same contents, so either can key a table.
+    """
+
+    def __init__(self, size: int, crosses: int = 0, noughts: int = 0):
+        self.size = size
+        self.crosses = crosses
+        self.noughts = noughts
+        self._code = None
+        self._representation = None
+
+    @property
+    def representation(self) -> List[List[str]]:
+        if self._representation is None:
+            representation = [[None] * self.size for _ in range(0, self.size)]
+            for (i, (x, y)) in enumerate(_cells(self.size)):
+                if self.crosses >> i & 1:
+                    representation[y][x] = crosses_symbol
+                elif self.noughts >> i & 1:
+                    representation[y][x] = noughts_symbol
+            self._representation = representation
+        return self._representation
+
+    def code(self) -> int:
+        if self._code is None:
+            code = 0
+            # Horner's rule from the last cell, as board_code does
+            for digit in reversed(self.digits()):
+                code = code * 3 + digit
+            self._code = code
+        return self._code
+
+    def digits(self) -> List[int]:
+        """
+        :return: The board_code digit of each cell, in row-major order
+        """
+        crosses_digit = symbol_digits[crosses_symbol]
+        noughts_digit = symbol_digits[noughts_symbol]
+        return [crosses_digit if self.crosses >> i & 1 else noughts_digit if self.noughts >> i & 1 else 0
+                for i in range(0, self.size * self.size)]
+
+    def canonical_code(self) -> int:
+        return canonical_digits_code(self.digits(), self.size)
+
+    def empty_cells(self) -> List[Tuple[int, int]]:
+        occupied = self.crosses | self.noughts
+        return [cell for (i, cell) in enumerate(_cells(self.size)) if not occupied >> i & 1]
+
+    def with_move(self, symbol: str, x: int, y: int) -> "BitboardState":
+        bit = 1 << (y * self.size + x)
+        if symbol == crosses_symbol:
+            return BitboardState(self.size, self.crosses | bit, self.noughts)
+        elif symbol == noughts_symbol:
+            return BitboardState(self.size, self.crosses, self.noughts | bit)
+        raise ValueError("Unknown symbol " + str(symbol))
+
+    def __eq__(self, other):
+        if isinstance(other, BitboardState):
+            return self.crosses == other.crosses and self.noughts == other.noughts and self.size == other.size
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return self.code()
+
+
+def bitboard_state(state: TicTacToeState) -> BitboardState:
+    """
+    :return: `state` as a BitboardState
+    """
+    if isinstance(state, BitboardState):
+        return state
+    size = len(state.representation)
+    board = BitboardState(size)
+    for (x, y) in _cells(size):
+        symbol = state.representation[y][x]
+        if symbol is not None:
+            board = board.with_move(symbol, x, y)
+    return board
+
+
+class BitboardTicTacToeDomain(Domain):
+    """
+    A drop-in for TicTacToeDomain whose current state is a BitboardState,
+    handed out without copying.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.state = BitboardState(size)
+
+    def apply_action(self, action: Action):
+        assert isinstance(action, TicTacToeAction)
+        bit = 1 << (action.y * self.size + action.x)
+        assert not (self.state.crosses | self.state.noughts) & bit
+        self.state = self.state.with_move(action.symbol, action.x, action.y)
+
+    def current_state(self):
+        return self.state
+
+    def reset(self):
+        self.state = BitboardState(self.size)
+
+
+class BitboardWinTicTacToeTask(Task):
+    """
+    A drop-in for WinTicTacToeTask that finds winners by AND-ing the players'
+    bitboards against precomputed line masks.
+    """
+
+    def reward(self, state, action, state_prime) -> float:
+        pass
+
+    def stateisfinal(self, state) -> bool:
+        state = bitboard_state(state)
+        if self.winner(state) is not None or self.draw(state):
+            return True
+        return False
+
+    def draw(self, state) -> bool:
+        state = bitboard_state(state)
+        return popcount(state.crosses | state.noughts) == state.size * state.size
+
+    def winner(self, state) -> str:
+        state = bitboard_state(state)
+        crosses = state.crosses
+        noughts = state.noughts
+        for mask in line_masks(state.size):
+            if crosses & mask == mask:
+                return crosses_symbol
+            if noughts & mask == mask:
+                return noughts_symbol
+        return None
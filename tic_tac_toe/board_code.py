@@ -0,0 +1,72 @@
+import functools
+from typing import List, Tuple
+
+# Base-3 digit of each cell's contents
+symbol_digits = {None: 0, "X": 1, "O": 2}
+
+
+def board_code(representation: List[List[str]]) -> int:
+    """
+    Encodes a board as a base-3 integer, where cell (x, y) is the digit of
+    weight 3 ** (y * size + x). Two boards have the same code exactly when
+    they have the same contents.
+    """
+    code = 0
+    for row in reversed(representation):
+        for item in reversed(row):
+            code = code * 3 + symbol_digits[item]
+    return code
+
+
+@functools.lru_cache(maxsize=None)
+def symmetries(size: int) -> Tuple[Tuple[int, ...], ...]:
+    """
+    The 8 rotations and reflections of a square board, each as the order in
+    which to read the original cells (row-major indices) to get the
+    transformed board. The identity comes first.
+    """
+    transforms = [lambda x, y: (x, y),
+                  lambda x, y: (size - 1 - y, x),
+                  lambda x, y: (size - 1 - x, size - 1 - y),
+                  lambda x, y: (y, size - 1 - x),
+                  lambda x, y: (size - 1 - x, y),
+                  lambda x, y: (x, size - 1 - y),
+                  lambda x, y: (y, x),
+                  lambda x, y: (size - 1 - y, size - 1 - x)]
+    orders = []
+    for transform in transforms:
+        order = []
+        for y in range(0, size):
+            for x in range(0, size):
+                source_x, source_y = transform(x, y)
+                order.append(source_y * size + source_x)
+        orders.append(tuple(order))
+    return tuple(orders)
+
+
+@functools.lru_cache(maxsize=None)
+def _reversed_symmetries(size: int) -> Tuple[Tuple[int, ...], ...]:
+    return tuple(tuple(reversed(order)) for order in symmetries(size))
+
+
+def canonical_board_code(representation: List[List[str]]) -> int:
+    """
+    The smallest board_code among the board's 8 symmetric variants, so that
+    boards that are rotations or reflections of each other share a code.
+    """
+    digits = [symbol_digits[item] for row in representation for item in row]
+    return canonical_digits_code(digits, len(representation))
+
+
+def canonical_digits_code(digits: List[int], size: int) -> int:
+    """
+    canonical_board_code of a board given as its row-major cell digits.
+    """
+    best = None
+    for order in _reversed_symmetries(size):
+        code = 0
+        for cell in order:
+            code = code * 3 + digits[cell]
+        if best is None or code < best:
+            best = code
+    return best
@@ -0,0 +1,42 @@
+from tic_tac_toe.bitboard import BitboardState, BitboardTicTacToeDomain, BitboardWinTicTacToeTask
+
+
+def non_loss_probability(agent, opponent_symbol: str, agent_first=False) -> float:
+    """
+    The exact probability that `agent`, playing greedily, wins or draws a
+    game against an opponent that picks uniformly among the empty cells, as
+    RandomAgent does. Positions are solved once each by memoized recursion
+    over the game tree.
+
+    :param agent: Anything with a `symbol`, a `domain` with a `size`, and a
+                  side-effect-free greedy_option(state) returning (x, y)
+    :param agent_first: Whether the agent makes the first move
+    """
+    size = agent.domain.size
+    task = BitboardWinTicTacToeTask(BitboardTicTacToeDomain(size))
+    # With the first player fixed, a board determines whose turn it is
+    memo = {}
+
+    def probability(state: BitboardState, agent_to_move: bool) -> float:
+        key = state.code()
+        known = memo.get(key)
+        if known is not None:
+            return known
+
+        winner = task.winner(state)
+        if winner is not None:
+            result = 1.0 if winner == agent.symbol else 0.0
+        elif task.draw(state):
+            result = 1.0
+        elif agent_to_move:
+            (x, y) = agent.greedy_option(state)
+            result = probability(state.with_move(agent.symbol, x, y), False)
+        else:
+            options = state.empty_cells()
+            result = sum(probability(state.with_move(opponent_symbol, x, y), True)
+                         for (x, y) in options) / len(options)
+
+        memo[key] = result
+        return result
+
+    return probability(BitboardState(size), agent_first)
@@ -0,0 +1,109 @@
+from typing import Tuple
+
+import numpy as np
+
+from tic_tac_toe import TicTacToeAgent, TicTacToeAction, Action
+from tic_tac_toe.afterstate_graph import AfterstateGraph, afterstate_graph
+
+
+class GraphLearningAgent(TicTacToeAgent):
+    """
+    LearningAgent over a precomputed AfterstateGraph. Values live in a flat
+    array indexed by state id, and a greedy move is an argmax over the
+    values of the current state's successors. It follows LearningAgent's
+    updates, ties and random draws exactly, so a seeded run learns the same
+    values.
+    """
+
+    def __init__(self, symbol: str, world, task, alpha=0.2, epsilon=0.1,
+                 initial_value=0.5, update_exploratory=False, random_tie_breaking=False,
+                 graph: AfterstateGraph = None):
+        """
+        :param graph: Defaults to the shared graph for the world's board size
+        """
+        super().__init__(symbol, world, task)
+        self.graph = graph if graph is not None else afterstate_graph(world.size)
+        self.random_tie_breaking = random_tie_breaking
+        self.update_exploratory = update_exploratory
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.initial_value = initial_value
+        self.table = self.graph.initial_values(symbol, initial_value)
+        self.offsets = self.graph.offsets[symbol]
+        self.targets = self.graph.targets[symbol]
+        self.moves = self.graph.moves[symbol]
+        self.previous_state = self.graph.state_id(world.current_state())
+        self.previous_move = None
+        self.was_exploratory = False
+
+    def choose_action(self, state) -> Action:
+        s = self.graph.state_id(state)
+        start = self.offsets[s]
+        end = self.offsets[s + 1]
+
+        if self.rng.random() < self.epsilon:
+            self.was_exploratory = True
+
+            choice = start + self.rng.randbelow(end - start)
+            self.previous_state = s
+            self.previous_move = self.targets[choice]
+
+            if self.update_exploratory:
+                self.update_value(self.previous_state, s)
+                self.previous_state = s
+
+                if self.previous_move is not None:
+                    self.update_value(self.previous_move, s)
+                self.previous_move = self.targets[choice]
+            return self._action(choice)
+        else:
+            self.was_exploratory = False
+
+        values = self.table[self.targets[start:end]]
+        if self.random_tie_breaking:
+            best = np.flatnonzero(values == values.max())
+            choice = start + best[self.rng.randbelow(len(best))]
+        else:
+            # argmax takes the first of the tied moves, as LearningAgent does
+            choice = start + int(np.argmax(values))
+
+        self.update_value(self.previous_state, s)
+        self.previous_state = s
+
+        if self.previous_move is not None:
+            self.update_value(self.previous_move, s)
+        self.previous_move = self.targets[choice]
+
+        return self._action(choice)
+
+    def greedy_option(self, state) -> Tuple[int, int]:
+        """
+        :return: The (x, y) of the move choose_action makes without exploring or random tie breaking
+        """
+        s = self.graph.state_id(state)
+        start = self.offsets[s]
+        edge = start + int(np.argmax(self.table[self.targets[start:self.offsets[s + 1]]]))
+        y, x = divmod(int(self.moves[edge]), self.graph.size)
+        return x, y
+
+    def _action(self, edge: int) -> Action:
+        y, x = divmod(int(self.moves[edge]), self.graph.size)
+        return TicTacToeAction(self.symbol, x, y)
+
+    def update_value(self, state: int, state_prime: int):
+        if self.was_exploratory and not self.update_exploratory:
+            return
+        prev_value = self.table[state]
+        error = self.table[state_prime] - prev_value
+        self.table[state] = prev_value + self.alpha * error
+
+    def prepare_for_new_episode(self, state):
+        self.previous_state = self.graph.state_id(state)
+
+    def see_result(self, state):
+        s = self.graph.state_id(state)
+        assert s != self.previous_state
+        self.update_value(self.previous_state, s)
+        self.update_value(self.previous_move, s)
+        self.previous_state = None
+        self.previous_move = None
@@ -1,16 +1,21 @@
-import random
-from copy import deepcopy
+from typing import List, Tuple
 
-from tic_tac_toe import TicTacToeAgent, TicTacToeState, TicTacToeAction, State, Action
+from rl.copy_on_write import CopyOnWriteDict
+from tic_tac_toe import TicTacToeAgent, TicTacToeAction, State, Action
 
 
 class LearningAgent(TicTacToeAgent):
     def __init__(self, symbol: str, world, task, alpha=0.2, epsilon=0.1,
-                 initial_value=0.5, update_exploratory=False, random_tie_breaking=False):
+                 initial_value=0.5, update_exploratory=False, random_tie_breaking=False, symmetric=False, table=None):
+        """
+        :param symmetric: Share one table entry between boards that are rotations or reflections of each other
+        :param table: Where to keep values, such as a BoundedDict. Defaults to an unbounded CopyOnWriteDict
+        """
         super().__init__(symbol, world, task)
+        self.symmetric = symmetric
         self.random_tie_breaking = random_tie_breaking
         self.update_exploratory = update_exploratory
-        self.table = {}
+        self.table = table if table is not None else CopyOnWriteDict()
         self.alpha = alpha
         self.epsilon = epsilon
         self.initial_value = initial_value
@@ -18,42 +23,83 @@ class LearningAgent(TicTacToeAgent):
         self.previous_move = None
         self.was_exploratory = False
 
+    def table_key(self, state: State) -> int:
+        """
+        :return: The key of `state` in the table: its board code, shared with its symmetric variants if `symmetric`
+        """
+        if self.symmetric:
+            return state.canonical_code()
+        return state.code()
+
     def value_of_state(self, state: State) -> float:
-        existing_value = self.table.get(state)
+        key = self.table_key(state)
+        existing_value = self.table.get(key)
 
         if existing_value is None:
-            new_value = self.initial_value
-            winner = self.task.winner(state)
-            if winner == self.symbol:
-                new_value = 1.0
-            elif winner != self.symbol and winner is not None:
-                new_value = 0.0
-            elif self.task.draw(state):
-                new_value = 1.0
-
-            self.table[state] = new_value
+            new_value = self.new_value(state)
+            self.table[key] = new_value
+            return new_value
+
+        return existing_value
+
+    def new_value(self, state: State) -> float:
+        """
+        :return: The value `state` gets when it's first added to the table
+        """
+        new_value = self.initial_value
+        winner = self.task.winner(state)
+        if winner == self.symbol:
+            new_value = 1.0
+        elif winner != self.symbol and winner is not None:
+            new_value = 0.0
+        elif self.task.draw(state):
+            new_value = 1.0
+        return new_value
+
+    def peek_value(self, state: State) -> float:
+        """
+        value_of_state without adding `state` to the table.
+        """
+        existing_value = self.table.get(self.table_key(state))
+        if existing_value is None:
+            return self.new_value(state)
+        return existing_value
+
+    def greedy_options(self, state: State) -> List[Tuple[int, int]]:
+        """
+        The (x, y) of every move whose afterstate has the highest value, in
+        row-major order. Neither the table nor the agent is changed.
+        """
+        max_options = []
+        max_value = float("-inf")
+        for option in state.empty_cells():
+            value = self.peek_value(self.state_for_action(state, option[0], option[1]))
+            if value > max_value:
+                max_value = value
+                max_options = [option]
+            elif value == max_value:
+                max_options.append(option)
+        return max_options
 
-        return self.table.get(state)
+    def greedy_option(self, state: State) -> Tuple[int, int]:
+        """
+        :return: The (x, y) of the move choose_action makes without exploring or random tie breaking
+        """
+        return self.greedy_options(state)[0]
 
     def value_of_action_in_state(self, state, x, y) -> float:
         return self.value_of_state(self.state_for_action(state, x, y))
 
     def state_for_action(self, state, x, y) -> State:
-        representation_copy = deepcopy(state.representation)
-        representation_copy[y][x] = self.symbol
-        return TicTacToeState(representation_copy)
+        return state.with_move(self.symbol, x, y)
 
     def choose_action(self, state) -> Action:
-        options = []
-        for y in range(0, len(state.representation)):
-            for x in range(0, len(state.representation[0])):
-                if state.representation[y][x] is None:
-                    options.append((x, y))
+        options = state.empty_cells()
 
-        if random.random() < self.epsilon:
+        if self.rng.random() < self.epsilon:
             self.was_exploratory = True
 
-            choice = random.choice(options)
+            choice = self.rng.choice(options)
             self.previous_state = state
             self.previous_move = self.state_for_action(state, choice[0],
                                                        choice[1])
@@ -70,20 +116,10 @@ class LearningAgent(TicTacToeAgent):
         else:
             self.was_exploratory = False
 
-        max_options = {}
-        max_value = float("-inf")
-        for option in options:
-            value = self.value_of_action_in_state(state, option[0], option[1])
-            if value > max_value:
-                max_value = value
-                max_options = [option]
-            elif value == max_value:
-                max_options.append(option)
-
-        assert max_options[0] is not None
+        max_options = self.greedy_options(state)
 
         if self.random_tie_breaking:
-            max_option = random.choice(max_options)
+            max_option = self.rng.choice(max_options)
         else:
             max_option = max_options[0]
 
@@ -101,11 +137,14 @@ class LearningAgent(TicTacToeAgent):
     def update_value(self, state, state_prime):
         if self.was_exploratory and not self.update_exploratory:
             return
+        # Nothing would change, and reading the values would add them to the table
+        if self.alpha == 0.0:
+            return
         prev_value = self.value_of_state(state)
         prime_value = self.value_of_state(state_prime)
 
         error = prime_value - prev_value
-        self.table[state] = prev_value + self.alpha * error
+        self.table[self.table_key(state)] = prev_value + self.alpha * error
 
     def prepare_for_new_episode(self, state):
         self.previous_state = state
@@ -0,0 +1,146 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from rl.action import Action
+from rl.domain import Domain
+from rl.task import Task
+from tic_tac_toe import TicTacToeState, TicTacToeAction
+from tic_tac_toe.board_code import symbol_digits, canonical_digits_code
+
+digit_symbols = {digit: symbol for (symbol, digit) in symbol_digits.items()}
+
+# (dx, dy) of rows, columns, diagonals and anti-diagonals
+line_directions = ((1, 0), (0, 1), (1, 1), (-1, 1))
+
+
+class MNKState(TicTacToeState):
+    """
+    A width x height board held as an array of board_code digits. It's
+    immutable, and hashes and compares like the TicTacToeState with the same
+    contents.
+    """
+
+    def __init__(self, board: np.ndarray):
+        self.board = board
+        self._code = None
+        self._representation = None
+
+    @property
+    def representation(self) -> List[List[str]]:
+        if self._representation is None:
+            self._representation = [[digit_symbols[digit] for digit in row] for row in self.board.tolist()]
+        return self._representation
+
+    def code(self) -> int:
+        if self._code is None:
+            code = 0
+            for digit in reversed(self.board.ravel().tolist()):
+                code = code * 3 + digit
+            self._code = code
+        return self._code
+
+    def canonical_code(self) -> int:
+        height, width = self.board.shape
+        if width != height:
+            return self.code()
+        return canonical_digits_code(self.board.ravel().tolist(), width)
+
+    def empty_cells(self) -> List[Tuple[int, int]]:
+        width = self.board.shape[1]
+        return [(i % width, i // width) for i in np.flatnonzero(self.board.ravel() == 0).tolist()]
+
+    def with_move(self, symbol: str, x: int, y: int) -> "MNKState":
+        board = self.board.copy()
+        board[y, x] = symbol_digits[symbol]
+        return MNKState(board)
+
+    def __eq__(self, other):
+        if isinstance(other, MNKState):
+            return np.array_equal(self.board, other.board)
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return self.code()
+
+
+def mnk_board(state: TicTacToeState) -> np.ndarray:
+    """
+    :return: `state`'s board as an array of board_code digits
+    """
+    if isinstance(state, MNKState):
+        return state.board
+    return np.array([[symbol_digits[item] for item in row] for row in state.representation], dtype=np.int8)
+
+
+def has_line(mask: np.ndarray, k: int) -> bool:
+    """
+    Whether `mask` has `k` consecutive True cells along a row, column or
+    diagonal. Each direction ANDs k shifted views of the whole board.
+    """
+    height, width = mask.shape
+    for (dx, dy) in line_directions:
+        # Cells a line of length k can start from
+        x_start = k - 1 if dx < 0 else 0
+        x_end = width - (k - 1) if dx > 0 else width
+        y_end = height - (k - 1) * dy
+        if x_end <= x_start or y_end <= 0:
+            continue
+        run = mask[0:y_end, x_start:x_end].copy()
+        for i in range(1, k):
+            run &= mask[i * dy:y_end + i * dy, x_start + i * dx:x_end + i * dx]
+        if run.any():
+            return True
+    return False
+
+
+class MNKDomain(Domain):
+    """
+    Tic-tac-toe on a width x height board, won by getting k in a row.
+    """
+
+    def __init__(self, width: int, height: int, k: int):
+        assert k <= max(width, height)
+        self.width = width
+        self.height = height
+        self.k = k
+        self.state = MNKState(np.zeros((height, width), dtype=np.int8))
+
+    def apply_action(self, action: Action):
+        assert isinstance(action, TicTacToeAction)
+        assert self.state.board[action.y, action.x] == 0
+        self.state = self.state.with_move(action.symbol, action.x, action.y)
+
+    def current_state(self):
+        return self.state
+
+    def reset(self):
+        self.state = MNKState(np.zeros((self.height, self.width), dtype=np.int8))
+
+
+class MNKWinTask(Task):
+    """
+    WinTicTacToeTask for an MNKDomain: a player wins with `domain.k` in a row.
+    """
+
+    def __init__(self, domain: MNKDomain):
+        super().__init__(domain)
+        self.k = domain.k
+
+    def reward(self, state, action, state_prime) -> float:
+        pass
+
+    def stateisfinal(self, state) -> bool:
+        if self.winner(state) is not None or self.draw(state):
+            return True
+        return False
+
+    def draw(self, state) -> bool:
+        return bool((mnk_board(state) != 0).all())
+
+    def winner(self, state) -> str:
+        board = mnk_board(state)
+        for digit in (symbol_digits["X"], symbol_digits["O"]):
+            if has_line(board == digit, self.k):
+                return digit_symbols[digit]
+        return None
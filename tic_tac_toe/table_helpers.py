@@ -32,4 +32,4 @@ def query(table):
                 representation[y][x] = in_value
 
         state = TicTacToeState(representation)
-        print(table.get(state))
+        print(table.get(state.code()))
@@ -1,25 +1,61 @@
-import hashlib
-import random
 from copy import deepcopy
-from typing import List
+from typing import List, Tuple
 
 from rl.action import Action
 from rl.agent import Agent
 from rl.domain import Domain
 from rl.state import State
 from rl.task import Task
+from .board_code import board_code, canonical_board_code
 
 
 class TicTacToeState(State):
     def __init__(self, representation: List[List[str]]):
+        """
+        :param representation: Must not be modified once the state has been hashed
+        """
         self.representation = representation
+        self._code = None
+
+    def code(self) -> int:
+        """
+        :return: The board's base-3 code (see board_code)
+        """
+        if self._code is None:
+            self._code = board_code(self.representation)
+        return self._code
+
+    def canonical_code(self) -> int:
+        """
+        :return: The board's code up to rotation and reflection (see canonical_board_code)
+        """
+        return canonical_board_code(self.representation)
+
+    def empty_cells(self) -> List[Tuple[int, int]]:
+        """
+        :return: The (x, y) of each empty cell, in row-major order
+        """
+        options = []
+        for y in range(0, len(self.representation)):
+            for x in range(0, len(self.representation[0])):
+                if self.representation[y][x] is None:
+                    options.append((x, y))
+        return options
+
+    def with_move(self, symbol: str, x: int, y: int) -> "TicTacToeState":
+        """
+        :return: The state after `symbol` is placed at (x, y)
+        """
+        representation_copy = deepcopy(self.representation)
+        representation_copy[y][x] = symbol
+        return TicTacToeState(representation_copy)
 
     def __hash__(self):
-        return int(hashlib.md5(self.__str__().encode()).hexdigest(), 16)
+        return self.code()
 
     def __eq__(self, other):
         if isinstance(other, TicTacToeState):
-            return other.__hash__() == self.__hash__()
+            return other.code() == self.code()
         return False
 
     def __str__(self):
@@ -142,13 +178,9 @@ class WinTicTacToeTask(Task):
 
 class RandomAgent(TicTacToeAgent):
     def choose_action(self, state: State):
-        options = []
-        for y in range(0, len(state.representation)):
-            for x in range(0, len(state.representation[0])):
-                if state.representation[y][x] is None:
-                    options.append((x, y))
+        options = state.empty_cells()
 
-        choice = random.choice(options)
+        choice = self.rng.choice(options)
 
         return TicTacToeAction(self.symbol, choice[0], choice[1])
 
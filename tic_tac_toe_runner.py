@@ -1,13 +1,20 @@
-import copy
-import sys
+import argparse
+import functools
+import random
+from typing import List
 
 import numpy as np
-import scipy as scipy
-from scipy import stats
 
 from tic_tac_toe import RandomAgent, WinTicTacToeTask, TicTacToeDomain, InteractiveAgent
 from tic_tac_toe.back_trace_agent import BacktraceAgent
+from tic_tac_toe.bitboard import BitboardTicTacToeDomain, BitboardWinTicTacToeTask
+from tic_tac_toe.exact_evaluation import non_loss_probability
+from tic_tac_toe.graph_agent import GraphLearningAgent
+from tic_tac_toe.mnk import MNKDomain, MNKWinTask
+from rl import bounded_dict
+from rl.bounded_dict import BoundedDict
 from tic_tac_toe.learning_agent import LearningAgent
+from rl.parallel import run_trials, seed_trial
 
 learning_agent_symbol = "X"
 random_agent_symbol = "O"
@@ -17,44 +24,73 @@ significance_level = 0.10
 
 
 def main():
-    num_evaluations = int(sys.argv[1])
-    num_trials = int(sys.argv[2])
-    experiment_num = int(sys.argv[3])
+    parser = argparse.ArgumentParser()
+    parser.add_argument("num_evaluations", type=int)
+    parser.add_argument("num_trials", type=int)
+    parser.add_argument("experiment_num", type=int)
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to run trials in")
+    parser.add_argument("--seed", type=int, default=None, help="Base seed; trial i is seeded with seed + i")
+    parser.add_argument("--bitboard", action="store_true", help="Play on the bitboard domain")
+    parser.add_argument("--graph", action="store_true",
+                        help="Learn over the precomputed afterstate graph. Not for the backtrace agent")
+    parser.add_argument("--sampled-evaluation", action="store_true",
+                        help="Estimate each evaluation from sampled games instead of computing it exactly")
+    parser.add_argument("--mnk", type=int, nargs=3, default=None, metavar=("WIDTH", "HEIGHT", "K"),
+                        help="Play k in a row on a width x height board. Evaluations are sampled")
+    parser.add_argument("--table-capacity", type=int, default=None,
+                        help="Most entries each learner's table keeps, evicting the least recently used. "
+                             "Not with --graph")
+    parser.add_argument("--table-bytes", type=int, default=None,
+                        help="Approximate memory ceiling for each learner's table. Not with --graph")
+    arguments = parser.parse_args()
+
+    num_evaluations = arguments.num_evaluations
+    num_trials = arguments.num_trials
+    experiment_num = arguments.experiment_num
+
+    def run(**kwargs):
+        return run_evaluations(num_trials, num_evaluations, workers=arguments.workers, seed=arguments.seed,
+                               bitboard=arguments.bitboard, graph=arguments.graph,
+                               sampled_evaluation=arguments.sampled_evaluation, mnk=arguments.mnk,
+                               table_capacity=arguments.table_capacity, table_bytes=arguments.table_bytes, **kwargs)
 
     def save(name, results):
         data = [*results]
         np.savetxt("results/n" + str(num_trials) + "_" + name + ".csv", data, delimiter=",")
 
     if experiment_num == 0:
-        book_results = run_evaluations(num_trials, num_evaluations)
+        book_results = run()
         save("standard", book_results)
     elif experiment_num == 1:
-        optimistic_results = run_evaluations(num_trials, num_evaluations, initial_value=1.0)
+        optimistic_results = run(initial_value=1.0)
         save("optimistic", optimistic_results)
     elif experiment_num == 2:
-        go_first_results = run_evaluations(num_trials, num_evaluations, learning_agent_first=True)
+        go_first_results = run(learning_agent_first=True)
         save("first", go_first_results)
     elif experiment_num == 3:
-        epsilon_results = run_evaluations(num_trials, num_evaluations, epsilon=0.15)
+        epsilon_results = run(epsilon=0.15)
         save("epsilon", epsilon_results)
     elif experiment_num == 4:
-        learn_epsilon = run_evaluations(num_trials, num_evaluations, learn_from_exploration=True, epsilon=0.2)
+        learn_epsilon = run(learn_from_exploration=True, epsilon=0.2)
         save("learn-epsilon", learn_epsilon)
     elif experiment_num == 5:
-        learn_epsilon = run_evaluations(num_trials, num_evaluations, backtrace_agent=True)
+        learn_epsilon = run(backtrace_agent=True)
         save("backtrace", learn_epsilon)
     elif experiment_num == 6:
-        learn_epsilon = run_evaluations(num_trials, num_evaluations, random_tie_breaking=True)
+        learn_epsilon = run(random_tie_breaking=True)
         save("random-tie-breaking", learn_epsilon)
     elif experiment_num == 7:
-        pessimistic_results = run_evaluations(num_trials, num_evaluations, initial_value=0.2)
+        pessimistic_results = run(initial_value=0.2)
         save("pessimistic", pessimistic_results)
     elif experiment_num == 8:
-        optimistic_alpha_results = run_evaluations(num_trials, num_evaluations, initial_value=1.0, alpha=0.6)
+        optimistic_alpha_results = run(initial_value=1.0, alpha=0.6)
         save("optimistic-alpha", optimistic_alpha_results)
     elif experiment_num == 9:
-        self_play_results = run_evaluations(num_trials, num_evaluations, self_play=True)
+        self_play_results = run(self_play=True)
         save("self-play", self_play_results)
+    elif experiment_num == 10:
+        symmetric_results = run(symmetric=True)
+        save("symmetric", symmetric_results)
 
 
 def run_evaluations(num_trials, num_evaluations,
@@ -65,67 +101,128 @@ def run_evaluations(num_trials, num_evaluations,
                     backtrace_agent=False,
                     random_tie_breaking=False,
                     alpha=0.2,
-                    self_play=False):
+                    self_play=False,
+                    symmetric=False,
+                    bitboard=False,
+                    graph=False,
+                    sampled_evaluation=False,
+                    mnk=None,
+                    table_capacity=None,
+                    table_bytes=None,
+                    workers=1,
+                    seed=None):
     assert num_trials > 1
-    evaluations_mean = []
-    evaluations_variance = []
+    check_arguments(backtrace_agent=backtrace_agent, symmetric=symmetric, graph=graph, mnk=mnk,
+                    table_capacity=table_capacity, table_bytes=table_bytes)
+    if seed is None:
+        seed = random.randrange(2 ** 31)
     series = [i * evaluation_period for i in range(0, num_evaluations)]
-    n = 0
-    for i in range(0, num_trials):
-        print("trial " + str(i))
-        j = int(0)
-        n += 1
-        for (num_episodes, table) in train_agent(evaluation_period,
-                                                 num_evaluations,
-                                                 initial_value=initial_value,
-                                                 learning_agent_first=learning_agent_first,
-                                                 epsilon=epsilon,
-                                                 update_on_exploration=learn_from_exploration,
-                                                 backtrace_agent=backtrace_agent,
-                                                 random_tie_breaking=random_tie_breaking,
-                                                 alpha=alpha,
-                                                 self_play=self_play):
-            evaluation = evaluate(table)
-            mean = None
-            variance = None
-            if j > len(evaluations_mean) - 1:
-                evaluations_mean.append(0.0)
-                evaluations_variance.append(0.0)
-                mean = 0.0
-                variance = 0.0
-            else:
-                mean = evaluations_mean[j]
-                variance = evaluations_variance[j]
-
-            delta = evaluation - mean
-            mean += delta / n
-            variance += delta * (evaluation - mean)
-
-            evaluations_mean[j] = mean
-            evaluations_variance[j] = variance
-            j += 1
-
-    evaluations_variance = [variance / (n - 1) for variance in
-                            evaluations_variance]
-
-    confidences = []
-    for (mean, variance) in zip(evaluations_mean, evaluations_variance):
-        crit = scipy.stats.t.ppf(1.0 - significance_level, n - 1)
-        width = crit * np.math.sqrt(variance) / np.math.sqrt(n)
-        confidences.append(width)
-
-    return series, evaluations_mean, evaluations_variance, confidences
-
-
-def evaluate(table) -> float:
-    task = WinTicTacToeTask()
+    training_arguments = dict(initial_value=initial_value,
+                              learning_agent_first=learning_agent_first,
+                              epsilon=epsilon,
+                              update_on_exploration=learn_from_exploration,
+                              backtrace_agent=backtrace_agent,
+                              random_tie_breaking=random_tie_breaking,
+                              alpha=alpha,
+                              self_play=self_play,
+                              symmetric=symmetric,
+                              bitboard=bitboard,
+                              graph=graph,
+                              mnk=mnk,
+                              table_capacity=table_capacity,
+                              table_bytes=table_bytes)
+    # The exact evaluator only knows full-length lines on square boards, and larger boards are too big for it
+    evaluator = evaluate_sampled if sampled_evaluation or mnk is not None else evaluate
+    trial = functools.partial(run_trial, num_evaluations, seed, training_arguments, evaluator)
+    statistics = run_trials(trial, num_trials, workers)
+
+    return series, statistics.means, statistics.variances(), statistics.confidences(significance_level)
+
+
+def run_trial(num_evaluations, seed, training_arguments, evaluator, i) -> List[float]:
+    seed_trial(seed + i)
+    print("trial " + str(i))
+    evaluations = []
+    for (num_episodes, table) in train_agent(evaluation_period,
+                                             num_evaluations,
+                                             **training_arguments):
+        evaluations.append(evaluator(table, **{key: training_arguments[key] for key in evaluation_keys}))
+    return evaluations
+
+
+# Training arguments the evaluators need to rebuild the learner's greedy policy
+evaluation_keys = ("initial_value", "symmetric", "bitboard", "graph", "mnk")
+
+
+def check_arguments(backtrace_agent=False, symmetric=False, graph=False, mnk=None, table_capacity=None,
+                    table_bytes=None):
+    """
+    Raises a ValueError for options that can't be combined.
+    """
+    if table_capacity is not None and table_capacity < 1:
+        raise ValueError("--table-capacity must be at least 1")
+    if table_bytes is not None and table_bytes < bounded_dict.entry_overhead:
+        raise ValueError("--table-bytes must be at least " + str(bounded_dict.entry_overhead))
+    if graph and mnk is not None:
+        raise ValueError("The afterstate graph is only built for 3x3 boards; drop --graph with --mnk")
+    if graph and (table_capacity is not None or table_bytes is not None):
+        raise ValueError("The afterstate graph keeps every value in a fixed array; "
+                         "drop --graph to bound the table")
+    if graph and backtrace_agent:
+        raise ValueError("The afterstate graph only backs LearningAgent, not BacktraceAgent")
+    if graph and symmetric:
+        raise ValueError("The afterstate graph has no symmetric variant; drop --graph for symmetric tables")
+
+
+def new_game(bitboard=False, mnk=None):
+    """
+    :param mnk: (width, height, k) to play k in a row instead of 3x3
+    :return: A domain and its task, backed by bitboards if `bitboard`
+    """
+    if mnk is not None:
+        domain = MNKDomain(*mnk)
+        return domain, MNKWinTask(domain)
+    if bitboard:
+        domain = BitboardTicTacToeDomain(3)
+        return domain, BitboardWinTicTacToeTask(domain)
     domain = TicTacToeDomain(3)
+    return domain, WinTicTacToeTask(domain)
 
-    random_agent = RandomAgent(random_agent_symbol, domain, task)
-    learning_agent = LearningAgent(learning_agent_symbol, domain, task)
+
+def greedy_agent(table, domain, task, initial_value=0.5, symmetric=False, graph=False):
+    """
+    :param initial_value: The value training gave unseen afterstates, so both backends value them alike
+    :return: A learning agent that plays greedily from `table` without updating it
+    """
+    if graph:
+        learning_agent = GraphLearningAgent(learning_agent_symbol, domain, task, initial_value=initial_value)
+    else:
+        learning_agent = LearningAgent(learning_agent_symbol, domain, task, initial_value=initial_value,
+                                       symmetric=symmetric)
     learning_agent.table = table
     learning_agent.epsilon = 0.0
     learning_agent.alpha = 0.0
+    return learning_agent
+
+
+def evaluate(table, initial_value=0.5, symmetric=False, bitboard=False, graph=False, mnk=None) -> float:
+    """
+    :return: The exact probability that the greedy agent doesn't lose to RandomAgent moving first
+    """
+    assert mnk is None
+    domain, task = new_game(bitboard)
+    learning_agent = greedy_agent(table, domain, task, initial_value, symmetric, graph)
+    return non_loss_probability(learning_agent, random_agent_symbol, agent_first=False)
+
+
+def evaluate_sampled(table, initial_value=0.5, symmetric=False, bitboard=False, graph=False, mnk=None) -> float:
+    """
+    :return: The fraction of `evaluation_trials` games against RandomAgent that the greedy agent doesn't lose
+    """
+    domain, task = new_game(bitboard, mnk)
+
+    random_agent = RandomAgent(random_agent_symbol, domain, task)
+    learning_agent = greedy_agent(table, domain, task, initial_value, symmetric, graph)
 
     agents = [random_agent, learning_agent]
 
@@ -157,26 +254,50 @@ def train_agent(evaluation_period, num_stops, initial_value=0.5,
                 backtrace_agent=False,
                 random_tie_breaking=False,
                 alpha=0.2,
-                self_play=False):
-    task = WinTicTacToeTask()
-    domain = TicTacToeDomain(3)
+                self_play=False,
+                symmetric=False,
+                bitboard=False,
+                graph=False,
+                mnk=None,
+                table_capacity=None,
+                table_bytes=None):
+    check_arguments(backtrace_agent=backtrace_agent, symmetric=symmetric, graph=graph, mnk=mnk,
+                    table_capacity=table_capacity, table_bytes=table_bytes)
+    domain, task = new_game(bitboard, mnk)
+
+    def new_table():
+        # Every dict-backed learner gets its own bounded table when a limit is given
+        if table_capacity is None and table_bytes is None:
+            return None
+        return BoundedDict(table_capacity, table_bytes)
 
     random_agent = RandomAgent(random_agent_symbol, domain, task)
     if backtrace_agent:
         learning_agent = BacktraceAgent(learning_agent_symbol, domain, task,
                                         initial_value=initial_value,
                                         epsilon=epsilon,
-                                        update_exploratory=update_on_exploration)
+                                        update_exploratory=update_on_exploration,
+                                        symmetric=symmetric,
+                                        table=new_table())
+    elif graph:
+        learning_agent = GraphLearningAgent(learning_agent_symbol, domain, task,
+                                            initial_value=initial_value,
+                                            epsilon=epsilon,
+                                            update_exploratory=update_on_exploration,
+                                            random_tie_breaking=random_tie_breaking,
+                                            alpha=alpha)
     else:
         learning_agent = LearningAgent(learning_agent_symbol, domain, task,
                                        initial_value=initial_value,
                                        epsilon=epsilon,
                                        update_exploratory=update_on_exploration,
                                        random_tie_breaking=random_tie_breaking,
-                                       alpha=alpha)
+                                       alpha=alpha,
+                                       symmetric=symmetric,
+                                       table=new_table())
 
     if self_play:
-        random_agent = LearningAgent(random_agent_symbol, domain, task)
+        random_agent = LearningAgent(random_agent_symbol, domain, task, table=new_table())
     agents = [random_agent, learning_agent]
 
     if learning_agent_first:
@@ -187,7 +308,7 @@ def train_agent(evaluation_period, num_stops, initial_value=0.5,
         if i % evaluation_period is 0:
             print(i)
             stops += 1
-            yield i, copy.deepcopy(learning_agent.table)
+            yield i, snapshot(learning_agent.table)
 
         if num_stops == stops:
             return
@@ -211,9 +332,18 @@ def train_agent(evaluation_period, num_stops, initial_value=0.5,
                     break
 
 
+def snapshot(table):
+    """
+    :return: A copy of a dict table or a graph agent's value array
+    """
+    if isinstance(table, np.ndarray):
+        return table.copy()
+    return table.snapshot()
+
+
 def interactive(table):
-    task = WinTicTacToeTask()
     domain = TicTacToeDomain(3)
+    task = WinTicTacToeTask(domain)
 
     interactive_agent = InteractiveAgent(random_agent_symbol, domain, task)
     learning_agent = LearningAgent(learning_agent_symbol, domain, task)
@@ -240,4 +370,5 @@ def interactive(table):
                     print(str(domain.current_state()))
 
 
-main()
+if __name__ == '__main__':
+    main()
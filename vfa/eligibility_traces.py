@@ -0,0 +1,49 @@
+import numpy as np
+
+
+class SparseEligibilityTraces:
+    """
+    Dutch eligibility traces over binary features, tracking only the indices
+    whose trace is above `threshold`. Decay, updates and reads touch the active
+    set alone, so their cost depends on how many features are traced rather
+    than on the total number of features.
+    """
+
+    def __init__(self, num_features: int, threshold=0.00001):
+        self.threshold = threshold
+        self.values = np.zeros(num_features)
+        self.active = np.zeros(0, dtype=np.int64)
+
+    def dot(self, features: np.ndarray) -> float:
+        """
+        :param features: Indices of active binary features
+        """
+        return self.values[features].sum()
+
+    def update(self, features: np.ndarray, alpha: float, gamma_lambda: float):
+        """
+        Decays every trace by `gamma_lambda` and applies the dutch trace increment
+        for binary features `features`.
+        """
+        increment = alpha * (1 - gamma_lambda * self.dot(features))
+        self.values[self.active] *= gamma_lambda
+        self.values[features] += increment
+        self.active = np.union1d(self.active, features)
+
+    def add_scaled_to(self, weights: np.ndarray, scale: float):
+        """
+        Adds `scale` times the traces to `weights`, in place.
+        """
+        weights[self.active] += scale * self.values[self.active]
+
+    def prune(self):
+        """
+        Zeroes and forgets traces that have fallen below the threshold.
+        """
+        keep = self.values[self.active] >= self.threshold
+        self.values[self.active[~keep]] = 0.0
+        self.active = self.active[keep]
+
+    def clear(self):
+        self.values[self.active] = 0.0
+        self.active = np.zeros(0, dtype=np.int64)
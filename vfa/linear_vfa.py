@@ -1,58 +1,140 @@
-from typing import List, Set
+import copy
+from typing import List
 
 import numpy as np
 
+from agent.state_action_value_table import greedy_mask
 from gridworld.feature_extractors import FeatureExtractor
 from rl.action import Action
 from rl.state import State
 
 
 class LinearVFA:
+    """
+    Linear action values. With per_action_vfa, each action has its own row in a
+    (num_actions, num_features) weight matrix, so all of a state's action values
+    are one matrix-vector product.
+    """
+
     def __init__(self, num_features, actions: List[Action], per_action_vfa=True, initial_value=0.0):
         self.num_features = num_features
         self.per_action_vfa = per_action_vfa
-        self.actions = actions
-        self.weights_per_action = dict()
+        self.actions = list(actions)
+        self.action_index = {action: i for (i, action) in enumerate(self.actions)}
+        self.weights_matrix = None
         self.weights = None
+        self._shared = False
         self.reset(initial_value)
 
     def reset(self, value=0.0):
         if self.per_action_vfa:
-            for action in self.actions:
-                self.weights_per_action[action] = np.zeros(self.num_features)
+            self.weights_matrix = np.zeros((len(self.actions), self.num_features))
         else:
             self.weights = np.zeros(self.num_features)
+        self._shared = False
+
+    def snapshot(self) -> "LinearVFA":
+        """
+        :return: A copy of the function, taken in constant time. Both share the
+                 weight matrix until one of them writes to it.
+        """
+        snapshot = copy.copy(self)
+        snapshot._shared = True
+        self._shared = True
+        return snapshot
 
     def actionvalue(self, features: np.ndarray, action: Action) -> float:
         return np.dot(self.weightsfor(action), features)
 
+    def sparseactionvalue(self, active: np.ndarray, action: Action) -> float:
+        """
+        The value of binary features given as the indices of the active ones.
+        """
+        return self.weightsfor(action)[active].sum()
+
+    def actionvalues(self, features: np.ndarray) -> np.ndarray:
+        """
+        Values of every action for state features shared by all actions.
+
+        :param features: A feature vector, or an (N, num_features) batch of them
+        :return: An array of values in the order of self.actions, with a leading batch axis for batches
+        """
+        return features.dot(self.weights_matrix.T)
+
+    def sparseactionvalues(self, active: np.ndarray) -> np.ndarray:
+        """
+        Values of every action for binary state features given by their active indices.
+
+        :param active: Active indices, or an (N, num_active) batch of them
+        :return: An array of values in the order of self.actions, with a leading batch axis for batches
+        """
+        return np.moveaxis(self.weights_matrix[:, active].sum(axis=-1), 0, -1)
+
+    def stateactionvalues(self, state: State, extractor: FeatureExtractor) -> np.ndarray:
+        """
+        :return: The value of every action in `state`, in the order of self.actions
+        """
+        if self.per_action_vfa and not extractor.action_dependent:
+            # Features don't depend on the action, so one extraction serves every row
+            action = self.actions[0]
+            if extractor.sparse:
+                return self.sparseactionvalues(extractor.extract_sparse(state, action))
+            return self.actionvalues(np.asarray(extractor.extract(state, action)))
+
+        values = np.empty(len(self.actions))
+        for (i, action) in enumerate(self.actions):
+            if extractor.sparse:
+                values[i] = self.sparseactionvalue(extractor.extract_sparse(state, action), action)
+            else:
+                values[i] = self.actionvalue(np.asarray(extractor.extract(state, action)), action)
+        return values
+
     def statevalue(self, features: List[float]):
         raise Exception()
 
-    def bestactions(self, state: State, extractor: FeatureExtractor) -> Set[Action]:
-        best_actions = []
-        best_value = float("-inf")
-        for action in self.actions:
-            state_features = extractor.extract(state, action)
-            value = self.actionvalue(state_features, action)
-            if value > best_value:
-                best_value = value
-                best_actions = [action]
-            elif value == best_value:
-                best_actions.append(action)
+    def bestactions(self, state: State, extractor: FeatureExtractor) -> List[Action]:
+        best = greedy_mask(self.stateactionvalues(state, extractor), tolerance=0.0)
+        return [self.actions[i] for i in np.flatnonzero(best)]
+
+    def bestactionmask(self, features: np.ndarray, sparse=False) -> np.ndarray:
+        """
+        Greedy actions for a batch of states.
 
-        return best_actions
+        :param features: (N, num_features) state features, or (N, num_active) active indices if `sparse`
+        :return: An (N, num_actions) boolean mask marking every action tied for best
+        """
+        if sparse:
+            values = self.sparseactionvalues(features)
+        else:
+            values = self.actionvalues(features)
+        return greedy_mask(values, tolerance=0.0)
 
     def weightsfor(self, action: Action) -> np.ndarray:
         if self.per_action_vfa:
-            weights = self.weights_per_action[action]
+            weights = self.weights_matrix[self.action_index[action]]
         else:
             weights = self.weights
         return weights
 
     def updateweightsfor(self, weights: np.ndarray, action: Action):
         if self.per_action_vfa:
-            self.weights_per_action[action] = weights
+            self._own()
+            self.weights_matrix[self.action_index[action]] = weights
         else:
             assert len(weights) == len(self.weights)
             self.weights = weights
+
+    def writableweightsfor(self, action: Action) -> np.ndarray:
+        """
+        :return: The weights used for `action`, safe to modify in place
+        """
+        self._own()
+        return self.weightsfor(action)
+
+    def _own(self):
+        if self._shared:
+            if self.per_action_vfa:
+                self.weights_matrix = self.weights_matrix.copy()
+            else:
+                self.weights = self.weights.copy()
+            self._shared = False